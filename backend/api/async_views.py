@@ -0,0 +1,138 @@
+"""
+Async entry points of the slow API views for the ASGI deployment.
+
+Under ASGI Django runs sync views one at a time per process, on the
+single thread it keeps for thread-sensitive code. The views listed in
+``EXECUTORS`` are swapped for async wrappers instead, which run the
+unchanged DRF view, its ORM calls and the rendering of the response body
+in a bounded thread pool and leave the event loop free meanwhile:
+
+* ``db`` serves the read endpoints, sized by ``ASYNC_DB_THREADS``;
+* ``render`` serves the PDF shopping list, sized by
+  ``ASYNC_RENDER_THREADS`` so that rendering cannot starve reads.
+
+Django 3.1 iterates a streaming response on the event loop, where the
+ORM refuses to run. Streaming bodies of pooled views are therefore
+written to a temporary file in the pool first and sent from there.
+
+Every other view is wrapped as well, still sync, so that its queries are
+counted by ``MetricsMiddleware`` in whatever thread Django runs it.
+
+Every pool thread keeps its own database connection. Connections are
+checked before and after each job like Django does around a request, so
+``CONN_MAX_AGE`` applies as under WSGI and a process opens at most one
+connection per pool thread plus one for the sync views.
+"""
+import asyncio
+import functools
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.urls import URLPattern, URLResolver
+
+EXECUTORS = {
+    'api:recipes-list': 'db',
+    'api:recipes-detail': 'db',
+    'api:recipes-facets': 'db',
+    'api:recipes-pantry': 'db',
+    'api:recipes-similar': 'db',
+    'api:recipes-changes': 'db',
+    'api:recipes-shopping-list': 'db',
+    'api:ingredients-list': 'db',
+    'api:ingredients-detail': 'db',
+    'api:tags-list': 'db',
+    'api:tags-detail': 'db',
+    'api:recipes-download-shopping-cart': 'render',
+    'api:export': 'db',
+}
+# Bytes of a spooled streaming body read per chunk sent.
+SPOOL_CHUNK = 64 * 1024
+
+_pools = {}
+
+
+def pool(name):
+    """Return the executor ``name``, created on first use in a process."""
+    if name not in _pools:
+        size = {
+            'db': settings.ASYNC_DB_THREADS,
+            'render': settings.ASYNC_RENDER_THREADS,
+        }[name]
+        _pools[name] = ThreadPoolExecutor(
+            size, thread_name_prefix=f'async-{name}')
+    return _pools[name]
+
+
+def count_queries(view):
+    """Wrap a sync ``view`` to run with ``request.metrics_queries``."""
+    @functools.wraps(view)
+    def counted_view(request, *args, **kwargs):
+        queries = getattr(request, 'metrics_queries', None)
+        if queries is None:
+            return view(request, *args, **kwargs)
+        with connection.execute_wrapper(queries):
+            return view(request, *args, **kwargs)
+    return counted_view
+
+
+def _run(view, request, args, kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+        if response.streaming:
+            _spool(response)
+        return response
+    finally:
+        close_old_connections()
+
+
+def _spool(response):
+    """Run the body generator of ``response`` now, keep it in a file."""
+    spooled = tempfile.TemporaryFile()
+    try:
+        for chunk in response.streaming_content:
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    finally:
+        response.close()
+    spooled.seek(0)
+    response.streaming_content = iter(
+        functools.partial(spooled.read, SPOOL_CHUNK), b'')
+    response._resource_closers.append(spooled.close)
+
+
+def run_in(name, view):
+    """Wrap a sync ``view`` into an async view running in pool ``name``."""
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool(name), functools.partial(
+            _run, view, request, args, kwargs))
+    return async_view
+
+
+def asyncify(patterns, namespace=None):
+    """Return ``patterns`` with queries counted, ``EXECUTORS`` made async."""
+    result = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            result.append(URLResolver(
+                pattern.pattern,
+                asyncify(pattern.url_patterns,
+                         pattern.namespace or namespace),
+                pattern.default_kwargs, pattern.app_name, pattern.namespace,
+            ))
+            continue
+        view = count_queries(pattern.callback)
+        name = EXECUTORS.get(f'{namespace}:{pattern.name}')
+        if name is not None:
+            view = run_in(name, view)
+        result.append(URLPattern(pattern.pattern, view,
+                                 pattern.default_args, pattern.name))
+    return result
@@ -0,0 +1,196 @@
+"""
+In-process benchmarks of the hot API paths.
+
+A fixed, seeded dataset is loaded into the test database and every
+scenario is driven through the DRF test client. For each scenario the
+latency percentiles, the number of SQL queries and the peak memory
+allocated by one run are recorded and compared with a stored baseline.
+"""
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes import scores, shopping_list
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag, TagRecipe)
+from users.models import CustomUser, Follow
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAQAAAAECAIAAAAmkwkpAAAA'
+    'FElEQVR4nGM8wcXFAANMDEgANwcALLoA5DVVUv0AAAAASUVORK5CYII='
+)
+
+
+def seed(users=50, recipes=300, ingredients_per_recipe=8, seed_value=42):
+    """Load a deterministic dataset and return the benchmark fixtures."""
+    rand = random.Random(seed_value)
+    with open(os.path.join(DATA_ROOT, 'ingredients.json'),
+              encoding='utf-8') as f:
+        Ingredient.objects.bulk_create(
+            Ingredient(**ingredient) for ingredient in json.load(f))
+    with open(os.path.join(DATA_ROOT, 'tags.json'), encoding='utf-8') as f:
+        Tag.objects.bulk_create(Tag(**tag) for tag in json.load(f))
+    CustomUser.objects.bulk_create(
+        CustomUser(email=f'user{i}@bench.io', username=f'user{i}',
+                   first_name='Bench', last_name=f'User{i}')
+        for i in range(users))
+    user_ids = list(CustomUser.objects.values_list('id', flat=True))
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        Recipe(author_id=rand.choice(user_ids), name=f'Recipe {i}',
+               text='Benchmark recipe. ' * 20, image='recipes/bench.png',
+               cooking_time=rand.randint(5, 120))
+        for i in range(recipes))
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                         amount=rand.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rand.sample(ingredient_ids,
+                                         ingredients_per_recipe))
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rand.sample(tag_ids, rand.randint(1, len(tag_ids))))
+    for model in (Favorite, ShoppingCart):
+        model.objects.bulk_create(
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in rand.sample(recipe_ids, 10))
+    Follow.objects.bulk_create(
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in rand.sample(user_ids, 8) if author_id != user_id)
+    shopping_list.rebuild()
+    scores.recompute()
+    user = CustomUser.objects.get(pk=user_ids[0])
+    return {
+        'user': user,
+        'token': Token.objects.create(user=user).key,
+        'recipe_id': Recipe.objects.filter(author=user).values_list(
+            'id', flat=True).first() or recipe_ids[0],
+        'other_recipe_id': rand.choice(recipe_ids),
+        'ingredient_ids': rand.sample(ingredient_ids, 8),
+        'tag_ids': tag_ids,
+    }
+
+
+def scenarios(fixtures):
+    """Return ``{name: callable(client)}`` for the benchmarked paths."""
+    recipe_id = fixtures['recipe_id']
+    other_id = fixtures['other_recipe_id']
+    recipe = {
+        'name': 'Benchmark', 'text': 'Benchmark recipe.', 'cooking_time': 10,
+        'image': IMAGE, 'tags': fixtures['tag_ids'][:2],
+        'ingredients': [
+            {'id': pk, 'amount': 10} for pk in fixtures['ingredient_ids']
+        ],
+    }
+
+    def toggle(name):
+        def run(client):
+            client.post(f'/api/recipes/{other_id}/{name}/')
+            return client.delete(f'/api/recipes/{other_id}/{name}/')
+        return run
+
+    return {
+        'recipe_list': lambda client: client.get('/api/recipes/?limit=6'),
+        'recipe_list_filtered': lambda client: client.get(
+            '/api/recipes/?tags=breakfast&tags=lunch&is_favorited=1'),
+        'recipe_detail': lambda client: client.get(
+            f'/api/recipes/{recipe_id}/'),
+        'recipe_create': lambda client: client.post(
+            '/api/recipes/', recipe, format='json'),
+        'recipe_update': lambda client: client.patch(
+            f'/api/recipes/{recipe_id}/', recipe, format='json'),
+        'favorite_toggle': toggle('favorite'),
+        'shopping_cart_toggle': toggle('shopping_cart'),
+        'subscriptions': lambda client: client.get(
+            '/api/users/subscriptions/?recipes_limit=3'),
+        'ingredient_search': lambda client: client.get(
+            '/api/ingredients/?name=са'),
+        'shopping_list_download': lambda client: client.get(
+            '/api/recipes/download_shopping_cart/'),
+    }
+
+
+def percentile(values, share):
+    values = sorted(values)
+    index = min(len(values) - 1, round(share * (len(values) - 1)))
+    return values[index]
+
+
+def measure(run, client, iterations=30, warmup=3):
+    """Return latency percentiles (ms), query count and peak memory (KiB)."""
+    for _ in range(warmup):
+        run(client)
+    with CaptureQueriesContext(connection) as queries:
+        response = run(client)
+    query_count = len(queries)
+    if response.status_code >= 400:
+        raise RuntimeError(
+            f'Unexpected status {response.status_code}: {response.content}')
+    tracemalloc.start()
+    run(client)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run(client)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'queries': query_count,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_all(fixtures, iterations=30, only=None):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {fixtures["token"]}')
+    return {
+        name: measure(run, client, iterations)
+        for name, run in scenarios(fixtures).items()
+        if not only or name in only
+    }
+
+
+def compare(results, baseline, threshold, slack_ms=2, slack_kib=64):
+    """
+    Return regressions of ``results`` against ``baseline``.
+
+    Query counts may not grow at all. Latency and memory may grow by
+    ``threshold`` (relative) and must also exceed an absolute slack, so
+    jitter on sub-millisecond paths does not fail the run.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(
+                f'{name}: {result["queries"]} queries, '
+                f'baseline {base["queries"]}')
+        for metric, slack in (('p50_ms', slack_ms), ('p95_ms', slack_ms),
+                              ('peak_kib', slack_kib)):
+            limit = max(base[metric] * (1 + threshold), base[metric] + slack)
+            if result[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {result[metric]}, '
+                    f'baseline {base[metric]}')
+    return regressions
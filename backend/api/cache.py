@@ -0,0 +1,267 @@
+"""
+Two-tier caching reporting its hit ratio to ``api.metrics``.
+
+The ``default`` cache is a file cache shared by all workers of a host,
+the ``local`` cache an in-process LRU in front of it. Plain
+``django.core.cache.cache`` users talk to the shared tier only, so a
+write in one worker is seen by the others.
+
+``Namespace`` caches values computed on a miss through both tiers:
+
+* keys carry the namespace version, ``invalidate()`` moves to a new one;
+* values past their ``timeout`` are served for ``stale`` more seconds
+  while one caller recomputes them;
+* concurrent misses of a key compute the value once, threads of a
+  process wait on an event, other processes poll the shared tier while
+  a lock entry is held there.
+
+A worker sees deletes and version changes of other workers once its
+front copies expire, after ``CACHE_FRONT_TIMEOUT`` seconds.
+
+When ``default`` is configured as a process-local cache, see
+``is_shared()``, namespaces compute every value, a copy one worker
+cached could never learn about writes served by another.
+"""
+import fcntl
+import hashlib
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends import dummy, filebased, locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from . import metrics
+
+MISSING = object()
+
+FRONT = 'local'
+SHARED = 'default'
+# Seconds between polls of a value another process is computing.
+POLL_INTERVAL = 0.02
+# Share of file cache writes which count the entries to cull.
+CULL_CHECK_RATE = 0.01
+
+
+class MetricsCacheMixin:
+    """
+    Counts hits and misses of ``get`` and ``get_many`` in metrics.
+
+    The ``ALIAS`` option names the cache in the labels, the location is
+    used when it is not given.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.alias = params.get('ALIAS', name) or 'default'
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        if value is MISSING:
+            metrics.CACHE_REQUESTS.inc(self.alias, 'miss')
+            return default
+        metrics.CACHE_REQUESTS.inc(self.alias, 'hit')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        if found:
+            metrics.CACHE_REQUESTS.inc(self.alias, 'hit', amount=len(found))
+        if len(keys) > len(found):
+            metrics.CACHE_REQUESTS.inc(
+                self.alias, 'miss', amount=len(keys) - len(found))
+        return found
+
+
+class LocMemCache(MetricsCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(MetricsCacheMixin, filebased.FileBasedCache):
+    """
+    File cache with ``add`` and ``incr`` atomic across processes.
+
+    Both hold an ``flock`` on one of 256 lock files picked by the key.
+    Culling lists the whole directory, only a sample of writes checks.
+    """
+
+    def _cull(self):
+        if random.random() < CULL_CHECK_RATE:
+            super()._cull()
+
+    @contextmanager
+    def _locked(self, key, version):
+        digest = hashlib.md5(
+            self.make_key(key, version).encode()).hexdigest()
+        os.makedirs(self._dir, 0o700, exist_ok=True)
+        with open(os.path.join(self._dir, f'{digest[:2]}.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked(key, version):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._locked(key, version):
+            return super().incr(key, delta, version)
+
+
+def is_shared(alias=SHARED):
+    """Tell whether all workers of a host see the same cache ``alias``."""
+    return not isinstance(
+        caches[alias], (locmem.LocMemCache, dummy.DummyCache))
+
+
+def relocated(directory):
+    """Return ``CACHES`` with file caches moved below ``directory``."""
+    return {
+        alias: dict(params, LOCATION=os.path.join(directory, alias))
+        if params['BACKEND'] == 'api.cache.FileBasedCache' else params
+        for alias, params in settings.CACHES.items()
+    }
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = MISSING
+
+
+class Namespace:
+    """Values of one kind computed on a miss, see the module docstring."""
+
+    def __init__(self, name, timeout, stale=0, front_timeout=None):
+        self.name = name
+        self.timeout = timeout
+        self.stale = stale
+        self.front_timeout = front_timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _front_timeout(self):
+        if self.front_timeout is None:
+            return settings.CACHE_FRONT_TIMEOUT
+        return self.front_timeout
+
+    def version(self):
+        key = f'namespace:{self.name}'
+        version = caches[FRONT].get(key)
+        if version is None:
+            shared = caches[SHARED]
+            version = shared.get(key)
+            if version is None:
+                shared.add(key, time.time_ns(), None)
+                version = shared.get(key)
+            caches[FRONT].set(key, version, settings.CACHE_FRONT_TIMEOUT)
+        return version
+
+    def invalidate(self):
+        """Drop every value of the namespace."""
+        key = f'namespace:{self.name}'
+        caches[SHARED].set(key, time.time_ns(), None)
+        caches[FRONT].delete(key)
+
+    def key(self, key):
+        return f'{self.name}:{self.version()}:{key}'
+
+    def delete(self, *keys):
+        full_keys = [self.key(key) for key in keys]
+        caches[SHARED].delete_many(full_keys)
+        caches[FRONT].delete_many(full_keys)
+
+    def get_or_set(self, key, compute):
+        """Return the value of ``key``, calling ``compute()`` on a miss."""
+        if not is_shared():
+            metrics.CACHE_NAMESPACE_REQUESTS.inc(self.name, 'miss')
+            return compute()
+        full_key = self.key(key)
+        entry, tier = self._lookup(full_key)
+        if entry is None:
+            return self._single_flight(full_key, compute)
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            metrics.CACHE_NAMESPACE_REQUESTS.inc(self.name, tier)
+            return value
+        if not caches[SHARED].add(f'{full_key}:lock', 1,
+                                  settings.CACHE_LOCK_TIMEOUT):
+            # Another caller is refreshing it.
+            metrics.CACHE_NAMESPACE_REQUESTS.inc(self.name, 'stale')
+            return value
+        metrics.CACHE_NAMESPACE_REQUESTS.inc(self.name, 'refresh')
+        try:
+            return self._store(full_key, compute())
+        finally:
+            caches[SHARED].delete(f'{full_key}:lock')
+
+    def _lookup(self, full_key):
+        entry = caches[FRONT].get(full_key)
+        if entry is not None and time.time() < entry[1]:
+            return entry, 'front'
+        shared = caches[SHARED].get(full_key)
+        if shared is None:
+            return entry, 'front'
+        caches[FRONT].set(full_key, shared, self._front_timeout())
+        return shared, 'shared'
+
+    def _store(self, full_key, value):
+        entry = (value, time.time() + self.timeout)
+        caches[SHARED].set(full_key, entry, self.timeout + self.stale)
+        caches[FRONT].set(full_key, entry, self._front_timeout())
+        return value
+
+    def _single_flight(self, full_key, compute):
+        with self._lock:
+            flight = self._flights.get(full_key)
+            leading = flight is None
+            if leading:
+                flight = self._flights[full_key] = Flight()
+        if not leading:
+            flight.done.wait(settings.CACHE_LOCK_TIMEOUT)
+            if flight.value is not MISSING:
+                metrics.CACHE_NAMESPACE_REQUESTS.inc(self.name, 'coalesced')
+                return flight.value
+            return self._compute(full_key, compute)
+        try:
+            flight.value = self._compute(full_key, compute)
+            return flight.value
+        finally:
+            with self._lock:
+                del self._flights[full_key]
+            flight.done.set()
+
+    def _wait(self, full_key, lock_key):
+        """Return the value the lock holder stores, MISSING if it gave up."""
+        shared = caches[SHARED]
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = shared.get(full_key)
+            if entry is not None:
+                caches[FRONT].set(full_key, entry, self._front_timeout())
+                return entry[0]
+            if shared.get(lock_key) is None:
+                break
+        return MISSING
+
+    def _compute(self, full_key, compute):
+        shared = caches[SHARED]
+        lock_key = f'{full_key}:lock'
+        held = shared.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT)
+        if not held:
+            value = self._wait(full_key, lock_key)
+            if value is not MISSING:
+                metrics.CACHE_NAMESPACE_REQUESTS.inc(self.name, 'coalesced')
+                return value
+            held = shared.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT)
+        metrics.CACHE_NAMESPACE_REQUESTS.inc(self.name, 'miss')
+        try:
+            return self._store(full_key, compute())
+        finally:
+            if held:
+                shared.delete(lock_key)
@@ -0,0 +1,55 @@
+"""
+Validators for conditional GET on recipes.
+
+ETags are derived from the ids and revisions of the rendered recipes plus
+the viewer's favourite, cart and follow state, which the representation
+embeds as flags, and the ``fields``, ``omit`` and ``expand`` parameters
+shaping it. ``Last-Modified`` only covers the recipes themselves, so
+``If-Modified-Since`` is honoured just for anonymous detail requests; for
+everything else the ETag decides.
+"""
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from users import memberships
+
+
+def viewer_state(user):
+    """Return a token that changes whenever the user's flags may change."""
+    if user.is_anonymous:
+        return 'anonymous'
+    return f'{user.pk}.{memberships.version(user)}'
+
+
+def make_etag(recipes, user, *extra):
+    parts = [viewer_state(user), *map(str, extra)]
+    parts.extend(f'{recipe.pk}:{recipe.revision}' for recipe in recipes)
+    return '"{}"'.format(
+        hashlib.sha1(';'.join(parts).encode()).hexdigest()
+    )
+
+
+def last_modified(recipes):
+    dates = [recipe.updated_at for recipe in recipes]
+    return timegm(max(dates).utctimetuple()) if dates else None
+
+
+def not_modified(request, etag, modified=None):
+    """Return a 304/412 response when the client's copy is still valid."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified
+    )
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+def set_validators(response, etag, modified=None):
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Authorization',))
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
@@ -0,0 +1,108 @@
+"""
+Pre-rendered recipe representations.
+
+``RecipeDocument`` keeps the ``RecipeListSerializer`` output of a recipe
+as rendered for nobody in particular, tagged with the recipe revision.
+Every change that alters the representation bumps the revision (recipe
+saves, and ``touch()`` for tags, ingredients and author profiles), so a
+document with another revision is stale and gets re-rendered the next
+time it is read. Requests load the documents of a page in one query and
+only fill in the viewer's flags and the absolute image URL. The documents
+of a page are cached by the ids and revisions on it, such a key never
+goes stale.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import Recipe, RecipeDocument
+from users import memberships
+
+from .cache import Namespace
+
+# Parameters changing the representation beyond the stored document.
+SHAPING_PARAMS = ('fields', 'omit', 'expand')
+# Fields a page needs when the body comes from documents.
+PAGE_FIELDS = ('id', 'revision', 'updated_at')
+
+PAGES = Namespace('recipe-pages', settings.RECIPE_PAGE_CACHE_TIMEOUT,
+                  front_timeout=settings.RECIPE_PAGE_CACHE_TIMEOUT)
+
+
+def usable(request):
+    return not any(request.query_params.get(name) for name in SHAPING_PARAMS)
+
+
+def build(recipe_ids):
+    """Render and store documents of ``recipe_ids``, return them by id."""
+    from .serializers import RecipeListSerializer
+
+    recipes = list(Recipe.objects.filter(id__in=recipe_ids).select_related(
+        'author').prefetch_related('tags'))
+    data = RecipeListSerializer(
+        recipes, many=True, context={'request': None}).data
+    documents = [
+        RecipeDocument(recipe_id=recipe.pk, revision=recipe.revision,
+                       data=json.dumps(item, ensure_ascii=False))
+        for recipe, item in zip(recipes, data)
+    ]
+    with transaction.atomic():
+        RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeDocument.objects.bulk_create(documents, ignore_conflicts=True)
+    return {document.recipe_id: document for document in documents}
+
+
+def _stale(recipes, documents):
+    return [
+        recipe.pk for recipe in recipes
+        if recipe.pk not in documents
+        or documents[recipe.pk].revision != recipe.revision
+    ]
+
+
+def load(recipes):
+    """Return current documents of ``recipes`` by id, building stale ones."""
+    documents = RecipeDocument.objects.in_bulk(
+        [recipe.pk for recipe in recipes])
+    stale = _stale(recipes, documents)
+    if stale:
+        documents.update(build(stale))
+    return documents
+
+
+def refresh(recipes):
+    """Build the missing and stale documents of ``recipes``, count them."""
+    stale = _stale(recipes, RecipeDocument.objects.in_bulk(
+        [recipe.pk for recipe in recipes]))
+    return len(build(stale)) if stale else 0
+
+
+def _page_data(recipes):
+    key = hashlib.sha1(','.join(
+        f'{recipe.pk}.{recipe.revision}' for recipe in recipes
+    ).encode()).hexdigest()
+    return PAGES.get_or_set(key, lambda: {
+        pk: document.data for pk, document in load(recipes).items()
+    })
+
+
+def render(recipes, request):
+    """Return the representation of ``recipes`` as seen by the viewer."""
+    data = _page_data(recipes)
+    viewer = memberships.for_request(request)
+    result = []
+    for recipe in recipes:
+        if recipe.pk not in data:
+            # Deleted since the page was read.
+            continue
+        item = json.loads(data[recipe.pk])
+        item['is_favorited'] = recipe.pk in viewer.favorites
+        item['is_in_shopping_cart'] = recipe.pk in viewer.cart
+        author = item['author']
+        author['is_subscribed'] = author['id'] in viewer.follows
+        if item['image']:
+            item['image'] = request.build_absolute_uri(item['image'])
+        result.append(item)
+    return result
@@ -0,0 +1,78 @@
+"""
+Sparse fieldsets selected by query parameters.
+
+``?fields=`` keeps only the listed fields and ``?omit=`` drops them. Both
+take comma separated names; fields of nested serializers are addressed
+with dots, e.g. ``fields=id,name,author.username`` or ``omit=author.email``.
+"""
+
+
+def _names(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def shape(request):
+    """
+    Return ``fields``, ``omit`` and ``expand`` of ``request`` normalized.
+
+    Names are sorted and deduplicated, requests rendering the same
+    representation get the same value.
+    """
+    return ';'.join(
+        '{}={}'.format(param, ','.join(sorted(set(
+            _names(request.query_params.get(param))))))
+        for param in ('fields', 'omit', 'expand')
+    )
+
+
+def requested(request, name, path=''):
+    """Tell whether field ``path + name`` will be rendered for ``request``."""
+    only = _level(request.query_params.get('fields'), path, nested=True)
+    omit = _level(request.query_params.get('omit'), path, nested=False)
+    return (not only or name in only) and name not in omit
+
+
+def _level(value, path, nested):
+    """Names in ``value`` that address fields at ``path``."""
+    prefix = f'{path}.' if path else ''
+    names = set()
+    for name in _names(value):
+        if not name.startswith(prefix):
+            continue
+        rest = name[len(prefix):]
+        if nested:
+            names.add(rest.split('.')[0])
+        elif '.' not in rest:
+            names.add(rest)
+    return names
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin applying ``?fields=`` and ``?omit=``.
+
+    Fields are removed before serialization, so method fields and nested
+    serializers that are left out never run their queries. The path of a
+    nested serializer is known once it is bound, which is when its fields
+    are first built.
+    """
+
+    def _field_path(self):
+        parts = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                parts.insert(0, node.field_name)
+            node = node.parent
+        return '.'.join(parts)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None:
+            return fields
+        path = self._field_path()
+        return {
+            name: field for name, field in fields.items()
+            if requested(request, name, path)
+        }
@@ -2,6 +2,8 @@ from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipe, Tag
+from recipes.scores import ORDERINGS
+from users import memberships
 
 
 class IngredientSearchFilter(SearchFilter):
@@ -9,7 +11,12 @@ class IngredientSearchFilter(SearchFilter):
     search_param = 'name'
 
 
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
 class AuthorAndTagFilter(FilterSet):
+    ids = NumberInFilter(field_name='id')
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
@@ -21,6 +28,9 @@ class AuthorAndTagFilter(FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    ordering = filters.ChoiceFilter(
+        choices=[(value, value) for value in ORDERINGS],
+        method='filter_ordering')
 
     def filter_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
@@ -32,6 +42,28 @@ class AuthorAndTagFilter(FilterSet):
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
+
+    def facet_selection(self):
+        """Return the valid filters as ``facet_index.count`` arguments."""
+        data = self.form.cleaned_data
+        within = None
+        if not self.request.user.is_anonymous:
+            viewer = memberships.for_request(self.request)
+            for name, ids in (('is_favorited', viewer.favorites),
+                              ('is_in_shopping_cart', viewer.cart)):
+                if data.get(name):
+                    within = ids if within is None else within & ids
+        ids, author = data.get('ids'), data.get('author')
+        return {
+            'ids': [int(pk) for pk in ids] if ids else None,
+            'tags': [tag.id for tag in data.get('tags') or ()],
+            'author': int(author) if author is not None else None,
+            'within': within,
+        }
+
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('ids', 'tags', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'ordering')
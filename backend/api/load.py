@@ -0,0 +1,395 @@
+"""
+Concurrent load generation against the API.
+
+A pool of worker threads either draws scenarios from a weighted mix or
+replays the requests of an nginx access log. Requests go through the
+Django test client in this process, or over HTTP to a running server
+(gunicorn, uvicorn) with ``base_url``. Per scenario the throughput,
+latency percentiles and error rate are reported, together with how many
+database connections were busy while its requests ran: counted exactly
+in-process, sampled from ``pg_stat_activity`` on PostgreSQL otherwise.
+"""
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from django.db import connection
+from django.urls import Resolver404, resolve
+from rest_framework.test import APIClient
+
+from .benchmarks import percentile
+
+DEFAULT_MIX = {
+    'browse': 40,
+    'detail': 20,
+    'search': 15,
+    'favorite': 8,
+    'shopping_cart': 7,
+    'subscriptions': 6,
+    'download': 4,
+}
+
+LOG_LINE = re.compile(
+    r'\[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" '
+    r'(?P<status>\d{3})'
+)
+LOG_TIME = '%d/%b/%Y:%H:%M:%S %z'
+REPLAYED_METHODS = ('GET', 'HEAD')
+
+
+class DatabaseLoad:
+    """Tracks busy database connections and attributes them to requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+        self.busy = 0
+        self.peak = 0
+
+    def start(self, request_id):
+        with self._lock:
+            self._active[request_id] = self.busy
+
+    def finish(self, request_id):
+        with self._lock:
+            return self._active.pop(request_id, 0)
+
+    def set_busy(self, busy):
+        with self._lock:
+            self.busy = busy
+            self.peak = max(self.peak, busy)
+            for request_id, seen in self._active.items():
+                self._active[request_id] = max(seen, busy)
+
+    def add_busy(self, delta):
+        with self._lock:
+            busy = self.busy + delta
+        self.set_busy(busy)
+
+    def wrapper(self):
+        """``execute_wrapper`` counting the queries running right now."""
+        def count_busy(execute, sql, params, many, context):
+            self.add_busy(1)
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.add_busy(-1)
+        return count_busy
+
+
+class PostgresSampler(threading.Thread):
+    """Polls ``pg_stat_activity`` for non-idle connections to the DB."""
+
+    def __init__(self, load, interval=0.05):
+        super().__init__(daemon=True)
+        self.load = load
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.capacity = None
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SHOW max_connections')
+                self.capacity = int(cursor.fetchone()[0])
+                while not self.stopped.wait(self.interval):
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() "
+                        "AND state NOT IN ('idle') AND pid <> pg_backend_pid()"
+                    )
+                    self.load.set_busy(cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+
+class LocalSession:
+    """Sends requests to the application in this process."""
+
+    def __init__(self, token):
+        self.token = token
+        self.client = APIClient()
+        if token:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def request(self, method, path):
+        return getattr(self.client, method.lower())(path).status_code
+
+    def get(self, path):
+        return self.client.get(path).json()
+
+
+class HttpSession:
+    """Sends requests to a server over keep-alive HTTP connections."""
+
+    def __init__(self, base_url, token):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f'Token {token}'
+
+    def request(self, method, path):
+        return self.session.request(
+            method, self.base_url + path, timeout=60).status_code
+
+    def get(self, path):
+        return self.session.get(self.base_url + path, timeout=60).json()
+
+
+def discover(session_factory):
+    """Collect ids and slugs the scenarios pick from, through the API."""
+    get = session_factory(0).get
+    recipes = get('/api/recipes/?limit=100&fields=id')
+    tags = get('/api/tags/')
+    names = get('/api/ingredients/')
+    names = names['results'] if isinstance(names, dict) else names
+    return {
+        'recipe_ids': [recipe['id'] for recipe in recipes['results']],
+        'pages': max(1, recipes['count'] // 6),
+        'tags': [tag['slug'] for tag in tags],
+        'prefixes': sorted({
+            ingredient['name'][:2] for ingredient in names[:200]
+        }) or ['a'],
+    }
+
+
+def scenarios(data):
+    """Return ``{name: callable(session, rand)}`` of the scenario mix."""
+    recipe_ids = data['recipe_ids']
+    # Recipes each user has in a list, or a worker is toggling right now;
+    # adding one of them again is a 400 that is no server error.
+    held = {}
+    held_lock = threading.Lock()
+
+    def browse(session, rand):
+        if rand.random() < 0.5:
+            page = rand.randint(1, min(data['pages'], 5))
+            return [session.request('GET',
+                                    f'/api/recipes/?page={page}&limit=6')]
+        tags = rand.sample(data['tags'], min(2, len(data['tags'])))
+        query = ''.join(f'&tags={tag}' for tag in tags)
+        return [session.request('GET', f'/api/recipes/?limit=6{query}')]
+
+    def detail(session, rand):
+        return [session.request(
+            'GET', f'/api/recipes/{rand.choice(recipe_ids)}/')]
+
+    def search(session, rand):
+        return [session.request(
+            'GET', f'/api/ingredients/?name={rand.choice(data["prefixes"])}')]
+
+    def toggle(name, flag):
+        def run(session, rand):
+            key = (session.token, name)
+            with held_lock:
+                if key not in held:
+                    ids = ','.join(map(str, recipe_ids))
+                    held[key] = {recipe['id'] for recipe in session.get(
+                        f'/api/recipes/?ids={ids}&{flag}=true&fields=id'
+                    )['results']}
+                free = [pk for pk in recipe_ids if pk not in held[key]]
+                if not free:
+                    return []
+                recipe_id = rand.choice(free)
+                held[key].add(recipe_id)
+            path = f'/api/recipes/{recipe_id}/{name}/'
+            try:
+                return [session.request('POST', path),
+                        session.request('DELETE', path)]
+            finally:
+                with held_lock:
+                    held[key].discard(recipe_id)
+        return run
+
+    return {
+        'browse': browse,
+        'detail': detail,
+        'search': search,
+        'favorite': toggle('favorite', 'is_favorited'),
+        'shopping_cart': toggle('shopping_cart', 'is_in_shopping_cart'),
+        'subscriptions': lambda session, rand: [session.request(
+            'GET', '/api/users/subscriptions/?recipes_limit=3')],
+        'download': lambda session, rand: [session.request(
+            'GET', '/api/recipes/download_shopping_cart/')],
+    }
+
+
+def parse_log(lines):
+    """Yield ``(offset seconds, method, path)`` of replayable log lines."""
+    first = None
+    for line in lines:
+        match = LOG_LINE.search(line)
+        if not match or match['method'] not in REPLAYED_METHODS:
+            continue
+        moment = datetime.strptime(match['time'], LOG_TIME)
+        first = first or moment
+        yield (moment - first).total_seconds(), match['method'], match['path']
+
+
+def route(path):
+    """Name a logged path by its URL pattern, ids do not split scenarios."""
+    try:
+        return resolve(path.split('?')[0]).view_name
+    except Resolver404:
+        return 'unmatched'
+
+
+class Recorder:
+    def __init__(self, load):
+        self.load = load
+        self._lock = threading.Lock()
+        self._ids = iter(range(1, 1 << 62))
+        self.samples = defaultdict(list)
+
+    def time(self, name, run):
+        with self._lock:
+            request_id = next(self._ids)
+        self.load.start(request_id)
+        start = time.perf_counter()
+        try:
+            statuses = run()
+        except Exception:
+            statuses = [None]
+        duration = time.perf_counter() - start
+        busy = self.load.finish(request_id)
+        if not statuses:
+            return
+        failed = any(status is None or status >= 400 for status in statuses)
+        with self._lock:
+            self.samples[name].append((duration, failed, busy))
+
+
+class Harness:
+    """Runs work from ``next_job()`` on ``concurrency`` threads."""
+
+    def __init__(self, session_factory, concurrency, in_process):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.in_process = in_process
+        self.load = DatabaseLoad()
+        self.recorder = Recorder(self.load)
+
+    def run(self, next_job):
+        sampler = None
+        if not self.in_process and connection.vendor == 'postgresql':
+            sampler = PostgresSampler(self.load)
+            sampler.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            futures = [
+                pool.submit(self.worker, number, next_job, start)
+                for number in range(self.concurrency)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+        capacity = self.concurrency
+        if sampler is not None:
+            sampler.stopped.set()
+            sampler.join()
+            capacity = sampler.capacity
+        elif not self.in_process:
+            capacity = None
+        return report(self.recorder.samples, elapsed, self.load.peak,
+                      capacity)
+
+    def worker(self, number, next_job, start):
+        session = self.session_factory(number)
+        rand = random.Random(number)
+        try:
+            if self.in_process:
+                with connection.execute_wrapper(self.load.wrapper()):
+                    self.loop(session, rand, next_job, start)
+            else:
+                self.loop(session, rand, next_job, start)
+        finally:
+            connection.close()
+
+    def loop(self, session, rand, next_job, start):
+        while True:
+            job = next_job(rand)
+            if job is None:
+                return
+            at, name, run = job
+            if at is not None:
+                delay = start + at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.recorder.time(name, lambda: run(session, rand))
+
+
+def mix_jobs(mix, data, requests_count=None, duration=None):
+    """``next_job`` drawing scenarios by weight until a limit is hit."""
+    runs = scenarios(data)
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_job(rand):
+        with lock:
+            if requests_count is not None and issued[0] >= requests_count:
+                return None
+            issued[0] += 1
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        name = rand.choices(names, weights)[0]
+        return None, name, runs[name]
+    return next_job
+
+
+def replay_jobs(entries, speed=0):
+    """
+    ``next_job`` handing out logged requests in order.
+
+    With ``speed`` the original spacing is kept, ``2`` replays twice as
+    fast; ``0`` sends requests as fast as the pool allows.
+    """
+    entries = iter(entries)
+    lock = threading.Lock()
+
+    def next_job(rand):
+        with lock:
+            entry = next(entries, None)
+        if entry is None:
+            return None
+        offset, method, path = entry
+        return (offset / speed if speed else None, route(path),
+                lambda session, rand: [session.request(method, path)])
+    return next_job
+
+
+def report(samples, elapsed, peak, capacity):
+    """Summarise samples per scenario and for the whole run."""
+    def summary(rows):
+        durations = [row[0] * 1000 for row in rows]
+        return {
+            'requests': len(rows),
+            'rps': round(len(rows) / elapsed, 1),
+            'p50_ms': round(statistics.median(durations), 3),
+            'p95_ms': round(percentile(durations, 0.95), 3),
+            'p99_ms': round(percentile(durations, 0.99), 3),
+            'error_rate': round(sum(row[1] for row in rows) / len(rows), 4),
+            'db_busy_peak': max(row[2] for row in rows),
+        }
+
+    scenarios = {
+        name: summary(rows) for name, rows in sorted(samples.items())
+    }
+    every = [row for rows in samples.values() for row in rows]
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'scenarios': scenarios,
+        'total': summary(every) if every else None,
+        'db_busy_peak': peak,
+        'db_capacity': capacity,
+        'db_saturation': round(peak / capacity, 3) if capacity else None,
+    }
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from api import benchmarks, cache
+
+BASELINE = os.path.join(settings.BASE_DIR, 'data', 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = 'benchmarking hot endpoints against a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=BASELINE)
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--threshold', default=0.5, type=float,
+                            help='allowed relative slowdown, 0.5 is 50%%')
+        parser.add_argument('--iterations', default=30, type=int)
+        parser.add_argument('--only', action='append',
+                            help='scenario name, may be repeated')
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        databases = runner.setup_databases()
+        rest_framework = dict(
+            settings.REST_FRAMEWORK,
+            DEFAULT_THROTTLE_RATES={},
+        )
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root,
+                                   CACHES=cache.relocated(media_root),
+                                   REST_FRAMEWORK=rest_framework,
+                                   CONCURRENCY_LIMITS={}):
+                fixtures = benchmarks.seed()
+                results = benchmarks.run_all(
+                    fixtures, options['iterations'], options['only'])
+        finally:
+            runner.teardown_databases(databases)
+            runner.teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.report(results)
+        if options['update_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+                f.write('\n')
+            print(f'Baseline written to {options["baseline"]}.')
+            return
+        try:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise CommandError("Baseline isn't in the directory, "
+                               'run with --update-baseline first.')
+        regressions = benchmarks.compare(
+            results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError(
+                'Performance regressions:\n' + '\n'.join(regressions))
+        print('No regressions.')
+
+    def report(self, results):
+        print(f'{"scenario":<24}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+              f'{"queries":>9}{"peak KiB":>10}')
+        for name, result in results.items():
+            print(f'{name:<24}{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+                  f'{result["p99_ms"]:>10}{result["queries"]:>9}'
+                  f'{result["peak_kib"]:>10}')
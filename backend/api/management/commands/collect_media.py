@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes import media
+
+
+class Command(BaseCommand):
+    help = 'deleting stored images no recipe refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int,
+                            help='seconds a blob must stay unused, '
+                                 'MEDIA_BLOB_GRACE by default')
+        parser.add_argument('--recount', action='store_true',
+                            help='rebuild reference counts first')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            print(f'Counted {media.count_references()} referenced files.')
+        print(f'Removed {media.collect(options["grace"])} files.')
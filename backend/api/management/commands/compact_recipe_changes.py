@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from recipes import sync
+
+
+class Command(BaseCommand):
+    help = 'dropping recipe change log rows superseded by later changes'
+
+    def handle(self, *args, **options):
+        print(f'Removed {sync.compact()} rows.')
@@ -0,0 +1,136 @@
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from api import load
+from users.models import CustomUser
+
+from .load_test import parse_mix
+
+DEPLOYMENTS = {
+    'wsgi': ['foodgram.wsgi:application'],
+    'asgi': ['foodgram.asgi:application',
+             '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+# Throttling would turn the load into 429s and the concurrency caps into
+# 503s, mostly on the ASGI side which admits more requests at once. Both
+# servers run without either, a zero limit disables a cap.
+UNTHROTTLED = {
+    **{name: '1000000/min' for name in (
+        'THROTTLE_RECIPES', 'THROTTLE_SHOPPING_LIST',
+        'THROTTLE_SUBSCRIPTIONS', 'THROTTLE_USERS',
+    )},
+    'CONCURRENCY_PDF': '0',
+    'CONCURRENCY_LISTING': '0',
+}
+STARTUP_TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ('comparing the wsgi and asgi deployments under the same load '
+            'at a fixed gunicorn worker count')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default=2, type=int)
+        parser.add_argument('--concurrency', action='append', type=int,
+                            help='client threads, may be repeated; '
+                                 'default 8 and 32')
+        parser.add_argument('--requests', default=300, type=int,
+                            help='scenario runs per concurrency level')
+        parser.add_argument('--mix', type=parse_mix,
+                            default=dict(load.DEFAULT_MIX),
+                            help='weights as name=weight,...')
+        parser.add_argument('--users', default=8, type=int,
+                            help='existing users whose tokens the clients '
+                                 'use')
+        parser.add_argument('--deployment', action='append',
+                            choices=DEPLOYMENTS,
+                            help='deployments to run, default both')
+        parser.add_argument('--json', help='write the results to this file')
+
+    def handle(self, *args, **options):
+        tokens = [
+            Token.objects.get_or_create(user=user)[0].key
+            for user in CustomUser.objects.order_by('id')[:options['users']]
+        ]
+        if not tokens:
+            raise CommandError('no users to authenticate the load with')
+        levels = options['concurrency'] or [8, 32]
+        results = {}
+        for name in options['deployment'] or list(DEPLOYMENTS):
+            with self.server(name, options['workers']) as url:
+                def session(number):
+                    return load.HttpSession(url, tokens[number % len(tokens)])
+                data = load.discover(session)
+                results[name] = {
+                    concurrency: load.Harness(
+                        session, concurrency, False
+                    ).run(load.mix_jobs(options['mix'], data,
+                                        options['requests']))
+                    for concurrency in levels
+                }
+        self.report(results, options['workers'])
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+                f.write('\n')
+
+    @contextlib.contextmanager
+    def server(self, name, workers):
+        port = free_port()
+        command = [
+            'gunicorn', *DEPLOYMENTS[name],
+            '--config', 'gunicorn.conf.py',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+        ]
+        process = subprocess.Popen(
+            command, cwd=settings.BASE_DIR,
+            env=dict(os.environ, **UNTHROTTLED),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        url = f'http://127.0.0.1:{port}'
+        try:
+            self.wait_ready(process, url)
+            print(f'{name}: gunicorn with {workers} workers on {url}')
+            yield url
+        finally:
+            process.terminate()
+            process.wait()
+
+    def wait_ready(self, process, url):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(
+                    f'server exited with code {process.returncode}')
+            try:
+                requests.get(url + '/api/tags/', timeout=1)
+                return
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        raise CommandError(f'server not ready after {STARTUP_TIMEOUT}s')
+
+    def report(self, results, workers):
+        print(f'{"deployment":<12}{"clients":>8}{"rps":>8}{"p50 ms":>10}'
+              f'{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+        for name, levels in results.items():
+            for concurrency, result in levels.items():
+                row = result['total']
+                print(f'{name:<12}{concurrency:>8}{row["rps"]:>8}'
+                      f'{row["p50_ms"]:>10}{row["p95_ms"]:>10}'
+                      f'{row["p99_ms"]:>10}{row["error_rate"]:>8.1%}')
+        print(f'{workers} gunicorn workers per deployment')
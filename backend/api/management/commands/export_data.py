@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from api.export import EXPORTS, FORMATS, ExportError, stream
+
+
+class Command(BaseCommand):
+    help = 'streaming export of a table as ndjson or csv'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(EXPORTS))
+        parser.add_argument('--format', default='ndjson', choices=FORMATS,
+                            dest='output_format')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--since', help='ISO timestamp, exclusive')
+        parser.add_argument('--since-id', type=int, help='id, exclusive')
+        parser.add_argument('--chunk-size', default=2000, type=int)
+        parser.add_argument('--output', default='-',
+                            help='file name, "-" for stdout')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('Wrong --since timestamp.')
+        try:
+            chunks = stream(
+                options['table'], options['output_format'], options['gzip'],
+                since=since, since_id=options['since_id'],
+                chunk_size=options['chunk_size'],
+            )
+        except ExportError as error:
+            raise CommandError(error)
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
+            return
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
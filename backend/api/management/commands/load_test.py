@@ -0,0 +1,132 @@
+import argparse
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from api import benchmarks, cache, load
+from users.models import CustomUser
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in load.DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}')
+        try:
+            mix[name.strip()] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'bad weight in {part!r}')
+    return mix
+
+
+class Command(BaseCommand):
+    help = ('running a concurrent scenario mix or an nginx access log '
+            'against the api')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url',
+                            help='server to load, e.g. http://localhost:8000; '
+                                 'by default a seeded test database is '
+                                 'loaded in-process')
+        parser.add_argument('--concurrency', default=8, type=int)
+        parser.add_argument('--requests', default=500, type=int,
+                            help='scenario runs in total')
+        parser.add_argument('--duration', type=float,
+                            help='seconds to run for instead of --requests')
+        parser.add_argument('--mix', type=parse_mix,
+                            default=dict(load.DEFAULT_MIX),
+                            help='weights as name=weight,...; scenarios: '
+                                 + ', '.join(load.DEFAULT_MIX))
+        parser.add_argument('--log', help='nginx access log to replay')
+        parser.add_argument('--speed', default=0, type=float,
+                            help='replay speed-up keeping the logged '
+                                 'spacing, 0 sends as fast as possible')
+        parser.add_argument('--token', action='append', default=[],
+                            help='auth token used with --url, may be '
+                                 'repeated to spread workers over users')
+        parser.add_argument('--users', default=50, type=int,
+                            help='users seeded in-process')
+        parser.add_argument('--recipes', default=300, type=int,
+                            help='recipes seeded in-process')
+        parser.add_argument('--json', help='write the report to this file')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            tokens = options['token'] or [None]
+            results = self.run(lambda number: load.HttpSession(
+                options['url'], tokens[number % len(tokens)]
+            ), False, options)
+        else:
+            results = self.run_in_process(options)
+        self.report(results)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+                f.write('\n')
+
+    def run_in_process(self, options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        databases = runner.setup_databases()
+        rest_framework = dict(
+            settings.REST_FRAMEWORK,
+            DEFAULT_THROTTLE_RATES={},
+        )
+        media_root = tempfile.mkdtemp()
+        if connection.vendor == 'sqlite' and options['concurrency'] > 1:
+            print('SQLite locks whole tables, expect "database table is '
+                  'locked" errors; load PostgreSQL for realistic numbers.')
+        try:
+            with override_settings(MEDIA_ROOT=media_root,
+                                   CACHES=cache.relocated(media_root),
+                                   REST_FRAMEWORK=rest_framework):
+                benchmarks.seed(users=options['users'],
+                                recipes=options['recipes'])
+                tokens = [
+                    Token.objects.get_or_create(user=user)[0].key
+                    for user in CustomUser.objects.order_by('id')[
+                        :options['concurrency']]
+                ]
+                return self.run(lambda number: load.LocalSession(
+                    tokens[number % len(tokens)]
+                ), True, options)
+        finally:
+            runner.teardown_databases(databases)
+            runner.teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def run(self, session_factory, in_process, options):
+        harness = load.Harness(
+            session_factory, options['concurrency'], in_process)
+        if options['log']:
+            with open(options['log'], encoding='utf-8') as f:
+                entries = list(load.parse_log(f))
+            return harness.run(load.replay_jobs(entries, options['speed']))
+        return harness.run(load.mix_jobs(
+            options['mix'], load.discover(session_factory),
+            None if options['duration'] else options['requests'],
+            options['duration']))
+
+    def report(self, results):
+        print(f'{"scenario":<28}{"requests":>9}{"rps":>8}{"p50 ms":>10}'
+              f'{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}{"db busy":>9}')
+        rows = list(results['scenarios'].items())
+        if results['total']:
+            rows.append(('total', results['total']))
+        for name, row in rows:
+            print(f'{name:<28}{row["requests"]:>9}{row["rps"]:>8}'
+                  f'{row["p50_ms"]:>10}{row["p95_ms"]:>10}{row["p99_ms"]:>10}'
+                  f'{row["error_rate"]:>8.1%}{row["db_busy_peak"]:>9}')
+        saturation = results['db_saturation']
+        print(f'{results["elapsed_s"]}s elapsed, database connections busy '
+              f'at peak: {results["db_busy_peak"]}'
+              + (f' of {results["db_capacity"]} ({saturation:.0%})'
+                 if saturation is not None else ''))
@@ -0,0 +1,73 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api import plans
+
+SNAPSHOT = os.path.join(settings.BASE_DIR, 'data', 'query_plans.json')
+
+
+class Command(BaseCommand):
+    help = ('explaining hot queries, suggesting indexes and checking '
+            'plan shapes against a stored snapshot')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', default=SNAPSHOT)
+        parser.add_argument('--update-snapshot', action='store_true')
+        parser.add_argument('--min-rows', default=1000, type=int,
+                            help='rows a scan or sort must touch to count')
+        parser.add_argument('--fail-on-findings', action='store_true')
+        parser.add_argument('--only', action='append',
+                            help='query name, may be repeated')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Query plans are checked on PostgreSQL only.')
+        shapes, suggestions = self.explain_all(
+            options['only'], options['min_rows'])
+        if options['update_snapshot']:
+            with open(options['snapshot'], 'w', encoding='utf-8') as f:
+                json.dump(shapes, f, indent=2, sort_keys=True)
+                f.write('\n')
+            print(f'Snapshot written to {options["snapshot"]}.')
+            return
+        try:
+            with open(options['snapshot'], encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            raise CommandError("Snapshot isn't in the directory, "
+                               'run with --update-snapshot first.')
+        errors = [
+            f'{name}: plan changed\n  was {json.dumps(snapshot[name])}\n'
+            f'  now {json.dumps(shapes[name])}'
+            for name in plans.compare(shapes, snapshot)
+        ]
+        if options['fail_on_findings'] and suggestions:
+            errors.append('Missing indexes:\n' + '\n'.join(
+                sorted(suggestions)))
+        if errors:
+            raise CommandError('\n'.join(errors))
+        print('Plans match the snapshot.')
+
+    def explain_all(self, only, min_rows):
+        shapes = {}
+        suggestions = set()
+        for name, queryset in plans.hot_queries().items():
+            if only and name not in only:
+                continue
+            with transaction.atomic():
+                plan = plans.explain(queryset)
+                transaction.set_rollback(True)
+            shapes[name] = plans.shape(plan)
+            found = plans.findings(plan, min_rows)
+            print(f'{name}: {plan["Actual Total Time"]:.2f} ms, '
+                  f'{len(found)} findings')
+            for problem, suggestion in found:
+                print(f'  {problem}')
+                if suggestion:
+                    print(f'    suggest: {suggestion}')
+                    suggestions.add(suggestion)
+        return shapes, suggestions
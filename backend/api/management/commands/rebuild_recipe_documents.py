@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from api import documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'rendering stored recipe documents ahead of requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=500, type=int)
+        parser.add_argument('--all', action='store_true',
+                            help='render current documents again as well')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.only('id', 'revision').order_by('id')
+        rendered = 0
+        batch = []
+        for recipe in recipes.iterator():
+            batch.append(recipe)
+            if len(batch) == options['batch_size']:
+                rendered += self.render(batch, options['all'])
+                batch = []
+        if batch:
+            rendered += self.render(batch, options['all'])
+        if options['all']:
+            documents.PAGES.invalidate()
+        print(f'Rendered {rendered} documents.')
+
+    def render(self, recipes, everything):
+        if everything:
+            return len(documents.build([recipe.pk for recipe in recipes]))
+        return documents.refresh(recipes)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = 'rebuilding shopping list totals from shopping carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', type=int,
+                            dest='users', help='user id, may be repeated')
+
+    def handle(self, *args, **options):
+        shopping_list.rebuild(options['users'])
+        print('Done.')
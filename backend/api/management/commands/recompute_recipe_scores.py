@@ -0,0 +1,15 @@
+from recipes import scores
+
+from ..periodic import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = 'recomputing popularity and trending scores of recipes'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def run(self, options):
+        count = scores.recompute(batch_size=options['batch_size'])
+        print(f'Scored {count} recipes.')
@@ -0,0 +1,15 @@
+from users import suggestions
+
+from ..periodic import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = 'recomputing suggested authors from the follow graph'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', default=500, type=int)
+
+    def run(self, options):
+        count = suggestions.refresh(batch_size=options['batch_size'])
+        print(f'Refreshed suggestions of {count} users.')
@@ -0,0 +1,23 @@
+from recipes import similarity
+
+from ..periodic import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = 'recomputing similar recipes from ingredient overlap'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--all', action='store_true',
+                            help='recompute every recipe, not only stale')
+        parser.add_argument('--batch-size', default=500, type=int)
+
+    def run(self, options):
+        only = None
+        if not options['all']:
+            only = list(similarity.stale_recipes())
+            if not only:
+                print('Nothing to refresh.')
+                return
+        count = similarity.refresh(only, batch_size=options['batch_size'])
+        print(f'Refreshed {count} recipes.')
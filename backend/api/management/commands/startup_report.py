@@ -0,0 +1,72 @@
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+BOOT = '''
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+from foodgram.wsgi import application
+get_resolver().url_patterns
+if {warm}:
+    from foodgram.startup import warm_up
+    warm_up()
+from foodgram.startup import memory_usage
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                  "memory": memory_usage()}}))
+'''
+
+
+def parse_importtime(output):
+    """Return ``[(module, self_us, cumulative_us)]`` of ``-X importtime``."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'reporting what a worker imports on boot and what it costs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', default=20, type=int)
+        parser.add_argument('--warm', action='store_true',
+                            help='include the pre-fork warm up')
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             BOOT.format(warm=options['warm'])],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            self.stderr.write(result.stderr[-2000:])
+            sys.exit(result.returncode)
+        boot = json.loads(result.stdout.splitlines()[-1])
+        modules = parse_importtime(result.stderr)
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split('.')[0]] += self_us
+        limit = options['limit']
+        print(f'Boot took {boot["seconds"]:.3f}s, '
+              f'{len(modules)} modules imported.')
+        for name, value in sorted(boot['memory'].items()):
+            print(f'{name:>14}: {value / 1024:8.1f} MiB')
+        print(f'\n{"package":<40}{"self ms":>10}')
+        for package, self_us in sorted(
+                packages.items(), key=lambda item: -item[1])[:limit]:
+            print(f'{package:<40}{self_us / 1000:>10.1f}')
+        print(f'\n{"module":<50}{"self ms":>10}{"cumulative ms":>16}')
+        for name, self_us, cumulative_us in sorted(
+                modules, key=lambda item: -item[1])[:limit]:
+            print(f'{name:<50}{self_us / 1000:>10.1f}'
+                  f'{cumulative_us / 1000:>16.1f}')
@@ -0,0 +1,61 @@
+from django.conf import settings
+
+from recipes import media
+
+from ..periodic import PeriodicCommand
+
+
+class Command(PeriodicCommand):
+    help = ('moving image files no recipe refers to into quarantine, '
+            'or deleting them')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--grace', type=int,
+                            help='seconds since the last change before a '
+                                 'file counts, MEDIA_BLOB_GRACE by default')
+        parser.add_argument('--delete', action='store_true',
+                            help='delete orphans instead of moving them to '
+                                 'MEDIA_QUARANTINE_DIR')
+        parser.add_argument('--retention', type=int,
+                            help='seconds before quarantined files are '
+                                 'deleted, MEDIA_QUARANTINE_RETENTION by '
+                                 'default')
+        parser.add_argument('--keep-quarantine', action='store_true',
+                            help='do not purge the quarantine directory')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='list orphans, change nothing')
+        parser.add_argument('--batch-size', default=500, type=int,
+                            help='files checked per query')
+        parser.add_argument('--rate', default=2000, type=float,
+                            help='files examined per second at most, '
+                                 '0 for no limit')
+
+    def run(self, options):
+        def log(name, size):
+            print(f'{name} {size / 1024:.1f} KiB')
+
+        stats = media.sweep(
+            grace=options['grace'],
+            quarantine=(None if options['delete']
+                        else settings.MEDIA_QUARANTINE_DIR),
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+            rate=options['rate'],
+            log=log if options['dry_run'] or options['verbosity'] > 1
+            else None,
+        )
+        if options['dry_run']:
+            done = 'nothing changed'
+        elif options['delete']:
+            done = 'deleted'
+        else:
+            done = f'moved to {settings.MEDIA_QUARANTINE_DIR}'
+        print(f'Scanned {stats["scanned"]} files, {stats["orphans"]} '
+              f'orphans of {stats["bytes"] / 1024 ** 2:.1f} MiB {done}.')
+        if options['dry_run'] or options['keep_quarantine']:
+            return
+        purged = media.purge_quarantine(
+            settings.MEDIA_QUARANTINE_DIR, options['retention'])
+        print(f'Purged {purged["purged"]} quarantined files of '
+              f'{purged["bytes"] / 1024 ** 2:.1f} MiB.')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+class PeriodicCommand(BaseCommand):
+    """
+    Command running ``run(options)`` once, or every ``--every`` seconds.
+
+    The repeating form is what the scheduled services of
+    ``infra/docker-compose.yml`` start.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int,
+                            help='keep running, repeating every so many '
+                                 'seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run(options)
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
+
+    def run(self, options):
+        raise NotImplementedError
@@ -0,0 +1,326 @@
+"""
+Multiprocess metrics exposed in the Prometheus text format.
+
+Every gunicorn worker owns a file in ``METRICS_DIR`` which it maps into
+memory and updates in place. The file holds ``(key, float64)`` records,
+the key naming a metric sample with its labels. Recording a value is a
+dict lookup and a ``struct.pack_into``, a few microseconds at most.
+``exposition()`` sums the records of all files. When a worker exits, the
+gunicorn master folds its file into an archive file, so counters survive
+worker restarts without the directory growing.
+
+Workers opt in with ``share()`` from the ``post_fork`` hook. Any other
+process, a management command or the development server, keeps its
+values in memory and exposes only its own, so it leaves no file behind
+that no master would fold.
+"""
+import bisect
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+INITIAL_SIZE = 64 * 1024
+USED = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+ARCHIVE = 'archive.db'
+LOCK = '.lock'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REGISTRY = {}
+
+
+class MemoryValues:
+    """Float values of this process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def add(self, key, amount):
+        with self._lock:
+            self._values[key] += amount
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class MmapValues:
+    """Float values stored by key in a memory mapped file."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            size = INITIAL_SIZE
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._positions = {}
+        self._used = USED.unpack_from(self._map, 0)[0] or USED.size
+        for key, position in _records(self._map, self._used):
+            self._positions[key] = position
+
+    def add(self, key, amount):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = VALUE.unpack_from(self._map, position)[0]
+            VALUE.pack_into(self._map, position, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padded = len(encoded) + (-(KEY_LENGTH.size + len(encoded)) % 8)
+        end = self._used + KEY_LENGTH.size + padded + VALUE.size
+        if end > len(self._map):
+            self._grow(end)
+        KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        start = self._used + KEY_LENGTH.size
+        self._map[start:start + len(encoded)] = encoded
+        position = start + padded
+        VALUE.pack_into(self._map, position, 0.0)
+        # Readers only look below ``used``, so it moves last.
+        self._used = end
+        USED.pack_into(self._map, 0, end)
+        self._positions[key] = position
+        return position
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _records(data, used):
+    """Yield ``(key, value position)`` of the records in ``data``."""
+    position = USED.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(data, position)[0]
+        start = position + KEY_LENGTH.size
+        key = bytes(data[start:start + length]).decode()
+        position = start + length + (-(KEY_LENGTH.size + length) % 8)
+        yield key, position
+        position += VALUE.size
+
+
+def read_file(path):
+    """Return ``{key: value}`` of a metrics file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < USED.size:
+        return {}
+    used = USED.unpack_from(data, 0)[0]
+    return {
+        key: VALUE.unpack_from(data, position)[0]
+        for key, position in _records(data, used)
+    }
+
+
+_values = None
+_shared = False
+
+
+def share():
+    """Record the values of this process in its file in ``METRICS_DIR``."""
+    global _shared, _values
+    _shared = True
+    _values = None
+
+
+def _process_values():
+    global _values
+    if _values is None:
+        if _shared:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            _values = MmapValues(
+                os.path.join(settings.METRICS_DIR, f'{os.getpid()}.db'))
+        else:
+            _values = MemoryValues()
+    return _values  # noqa: R504
+
+
+def _forget_parent_values():
+    global _shared, _values
+    _shared = False
+    _values = None
+
+
+os.register_at_fork(after_in_child=_forget_parent_values)
+
+
+@contextmanager
+def _directory_lock(operation):
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with open(os.path.join(settings.METRICS_DIR, LOCK), 'a') as f:
+        fcntl.flock(f, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._keys = {}
+        REGISTRY[name] = self
+
+    def _key(self, suffix, labels, le=None):
+        cache_key = (suffix, labels, le)
+        key = self._keys.get(cache_key)
+        if key is None:
+            key = json.dumps([self.name, suffix, labels, le])
+            self._keys[cache_key] = key
+        return key
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        _process_values().add(self._key('', labels), amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, *labels):
+        values = _process_values()
+        le = self.buckets[bisect.bisect_left(self.buckets, value)]
+        values.add(self._key('_bucket', labels, le), 1)
+        values.add(self._key('_sum', labels), value)
+        values.add(self._key('_count', labels), 1)
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Request latency by view and action.',
+    ('view', 'action', 'method'))
+RESPONSES = Counter(
+    'http_responses_total', 'Responses by view, action and status.',
+    ('view', 'action', 'status'))
+DB_QUERIES = Counter(
+    'db_queries_total', 'SQL queries run while serving a view.', ('view',))
+DB_DURATION = Counter(
+    'db_query_duration_seconds_total', 'Time spent in SQL queries by view.',
+    ('view',))
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by cache alias and result.',
+    ('cache', 'result'))
+CACHE_NAMESPACE_REQUESTS = Counter(
+    'cache_namespace_requests_total',
+    'Namespace lookups by result: front, shared, stale, refresh, coalesced '
+    'or miss.', ('namespace', 'result'))
+PDF_RENDER = Histogram(
+    'pdf_render_duration_seconds', 'Shopping list PDF rendering time.')
+
+
+def merge(pid):
+    """Fold the file of exited process ``pid`` into the archive."""
+    path = os.path.join(settings.METRICS_DIR, f'{pid}.db')
+    if not os.path.exists(path):
+        return
+    with _directory_lock(fcntl.LOCK_EX):
+        archive = MmapValues(os.path.join(settings.METRICS_DIR, ARCHIVE))
+        try:
+            for key, value in read_file(path).items():
+                archive.add(key, value)
+        finally:
+            archive.close()
+        os.remove(path)
+
+
+def reset():
+    """Remove all stored values, done once before workers start."""
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        os.remove(path)
+
+
+def collect():
+    """Return ``{key: value}`` summed over all processes."""
+    totals = defaultdict(float)
+    if isinstance(_values, MemoryValues):
+        for key, value in _values.items():
+            totals[key] += value
+    if not os.path.isdir(settings.METRICS_DIR):
+        return totals
+    with _directory_lock(fcntl.LOCK_SH):
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+            try:
+                values = read_file(path)
+            except FileNotFoundError:
+                continue
+            for key, value in values.items():
+                totals[key] += value
+    return totals
+
+
+def _format_labels(names, values, le=None):
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values)
+    ]
+    if le is not None:
+        pairs.append('le="{}"'.format('+Inf' if le == float('inf') else le))
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def exposition():
+    """Render all metrics in the Prometheus text exposition format."""
+    samples = defaultdict(dict)
+    for key, value in collect().items():
+        name, suffix, labels, le = json.loads(key)
+        samples[name][suffix, tuple(labels), le] = value
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        values = samples.get(name, {})
+        if metric.kind == 'counter':
+            for (_, labels, _), value in sorted(values.items()):
+                lines.append(f'{name}'
+                             f'{_format_labels(metric.labelnames, labels)}'
+                             f' {value}')
+            continue
+        label_sets = sorted({labels for _, labels, _ in values})
+        for labels in label_sets:
+            cumulative = 0
+            for le in metric.buckets:
+                cumulative += values.get(('_bucket', labels, le), 0)
+                lines.append(
+                    f'{name}_bucket'
+                    f'{_format_labels(metric.labelnames, labels, le)}'
+                    f' {cumulative}')
+            label_text = _format_labels(metric.labelnames, labels)
+            lines.append(f'{name}_sum{label_text} '
+                         f'{values.get(("_sum", labels, None), 0)}')
+            lines.append(f'{name}_count{label_text} '
+                         f'{values.get(("_count", labels, None), 0)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,127 @@
+import asyncio
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import metrics, profiling
+
+
+class AsyncCapableMiddleware:
+    """
+    Middleware running natively under both WSGI and ASGI.
+
+    Under ASGI ``__call__`` returns the coroutine of ``acall``, so the
+    handler does not hop to a thread for it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function for the handler,
+            # as MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        return self.call(request)
+
+    async def acall(self, request):
+        return await self.get_response(request)
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Profiles requests flagged by staff or picked by sampling.
+
+    Staff opt in with the ``X-Profile`` header or the ``profile`` query
+    parameter and get the ``X-Profile-Id`` of the capture back;
+    ``PROFILING_SAMPLE_RATE`` profiles a random share of all requests
+    without telling the client. Requests pass through unprofiled under
+    ASGI, the profiler follows one thread.
+    """
+
+    def call(self, request):
+        if self.is_requested(request):
+            return profiling.capture(request, self.get_response, expose=True)
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return profiling.capture(request, self.get_response)
+        return self.get_response(request)
+
+    def is_requested(self, request):
+        if not (request.headers.get('X-Profile')
+                or request.GET.get('profile')):
+            return False
+        return self.is_staff(request)
+
+    def is_staff(self, request):
+        if request.user.is_authenticated:
+            return request.user.is_staff
+        try:
+            auth = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return bool(auth) and auth[0].is_staff
+
+
+def query_counter(queries):
+    """``execute_wrapper`` adding to ``queries``, ``[count, seconds]``."""
+    def count_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries[0] += 1
+            queries[1] += time.perf_counter() - start
+    return count_query
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Records latency, status and SQL work of every request in metrics.
+
+    Requests are labelled by URL name and viewset action, which keeps the
+    number of series bounded whatever the ids in the path. Under ASGI the
+    views wrapped by ``async_views.asyncify`` count their queries, they
+    pick the wrapper up from ``request.metrics_queries``; queries run by
+    middleware outside the view are not counted there.
+    """
+
+    def call(self, request):
+        queries = [0, 0.0]
+        start = time.perf_counter()
+        with connection.execute_wrapper(query_counter(queries)):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def acall(self, request):
+        queries = [0, 0.0]
+        request.metrics_queries = query_counter(queries)
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    def record(self, request, response, duration, queries):
+        view, action = self.labels(request)
+        metrics.REQUEST_DURATION.observe(
+            duration, view, action, request.method)
+        metrics.RESPONSES.inc(view, action, response.status_code)
+        if queries[0]:
+            metrics.DB_QUERIES.inc(view, amount=queries[0])
+            metrics.DB_DURATION.inc(view, amount=queries[1])
+
+    def labels(self, request):
+        match = request.resolver_match
+        if match is None:
+            return 'unmatched', ''
+        actions = getattr(match.func, 'actions', None) or {}
+        return match.view_name, actions.get(request.method.lower(), '')
@@ -1,6 +1,43 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        """A batch asked for by ``?ids=`` fits one page unless limited."""
+        ids = request.query_params.get('ids')
+        if ids and self.page_size_query_param not in request.query_params:
+            return min(len(ids.split(',')), self.max_page_size)
+        return super().get_page_size(request)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator which trusts planner statistics for huge tables.
+
+    Unfiltered changelists of tables bigger than
+    ``ADMIN_ESTIMATED_COUNT_THRESHOLD`` rows take their size from
+    ``pg_class.reltuples`` instead of running ``COUNT(*)``.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if (connection.vendor == 'postgresql'
+                and not queryset.query.where):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
@@ -0,0 +1,71 @@
+"""
+Shopping list PDF rendering.
+
+``reportlab`` is only imported when a PDF is actually built, so workers
+that never serve a download do not pay for it. The font is registered
+once per process; ``preload()`` does that in the gunicorn master, so
+forked workers share it. Rendered lists are cached by their content.
+"""
+import hashlib
+import io
+import os
+import time
+
+from django.conf import settings
+
+from . import metrics
+from .cache import Namespace
+
+FONT_NAME = 'DejaVuSans'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'fonts', 'DejaVuSans.ttf')
+
+_font_registered = False
+
+SHOPPING_LISTS = Namespace('shopping-lists',
+                           settings.SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def register_font():
+    global _font_registered
+    if _font_registered:
+        return
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH, 'UTF-8'))
+    _font_registered = True
+
+
+def preload():
+    """Import reportlab and register the font ahead of the first request."""
+    from reportlab.pdfgen import canvas  # noqa: F401
+    register_font()
+
+
+def shopping_list(output, ingredients):
+    """Draw ``(name, unit, amount)`` rows onto the file-like ``output``."""
+    from reportlab.pdfgen import canvas
+    register_font()
+    start = time.perf_counter()
+    page = canvas.Canvas(output)
+    page.setFont(FONT_NAME, size=20)
+    page.drawString(230, 770, 'Ingredients list')
+    page.setFont(FONT_NAME, size=12)
+    height = 650
+    for ingredient in ingredients:
+        page.drawString(60, height, '{} ({}) - {}'.format(*ingredient))
+        height -= 20
+    page.showPage()
+    page.save()
+    metrics.PDF_RENDER.observe(time.perf_counter() - start)
+
+
+def shopping_list_content(ingredients):
+    """Return the PDF of ``ingredients``, rendered once per distinct list."""
+    ingredients = list(ingredients)
+
+    def render():
+        output = io.BytesIO()
+        shopping_list(output, ingredients)
+        return output.getvalue()
+    key = hashlib.sha256(repr(ingredients).encode()).hexdigest()
+    return SHOPPING_LISTS.get_or_set(key, render)
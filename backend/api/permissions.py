@@ -1,3 +1,6 @@
+import hmac
+
+from django.conf import settings
 from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 
@@ -10,3 +13,15 @@ class IsAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         return (request.method in SAFE_METHODS
                 or request.user and request.user.is_staff)
+
+
+class IsAdminOrMetricsToken(BasePermission):
+    """Staff users, or scrapers sending ``Bearer <METRICS_TOKEN>``."""
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        header = request.headers.get('Authorization', '')
+        return bool(token) and hmac.compare_digest(
+            header.encode(), f'Bearer {token}'.encode())
@@ -0,0 +1,179 @@
+"""
+Query plan checks for the hot queries of the API.
+
+Every query runs under ``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`` on
+PostgreSQL. Sequential scans and sorts that touch many rows are reported
+together with the index that would avoid them, and the plan shape (node
+types, relations and indexes, without costs) is compared with a stored
+snapshot so a query silently falling off its index is caught.
+"""
+import json
+import re
+
+from django.db.models import Count
+
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, SimilarRecipe)
+from users.models import CustomUser, Follow
+
+COLUMN = re.compile(r'\(?"?(\w+)"?\)?(?:::\w+)?\)?\s*(?:=|~~|<|>|@>)')
+SORT_KEY = re.compile(r'(?:\w+\.)?(\w+)( DESC)?')
+MISESTIMATE = 10
+
+
+def hot_queries():
+    """Return ``{name: queryset}`` shaped like the queries views run."""
+    user = CustomUser.objects.annotate(
+        favorites_count=Count('favorites')
+    ).order_by('-favorites_count').first()
+    author_id = Recipe.objects.values('author').annotate(
+        recipes_count=Count('id')
+    ).order_by('-recipes_count').values_list('author', flat=True).first()
+    recipe_id = Recipe.objects.values_list('id', flat=True).first()
+    return {
+        'recipe_list': Recipe.objects.all()[:6],
+        'recipe_list_by_author': Recipe.objects.filter(
+            author_id=author_id)[:6],
+        'recipe_list_favorited': Recipe.objects.filter(
+            favorites__user=user)[:6],
+        'recipe_list_in_shopping_cart': Recipe.objects.filter(
+            shopping_cart__user=user)[:6],
+        'user_favorites': Favorite.objects.filter(user=user)[:6],
+        'user_shopping_cart': ShoppingCart.objects.filter(user=user),
+        'shopping_list': ShoppingListItem.objects.filter(user=user),
+        'subscriptions': Follow.objects.filter(user=user)[:6],
+        'author_recipes': Recipe.objects.filter(
+            author_id=author_id).order_by('-pub_date')[:3],
+        'similar_recipes': SimilarRecipe.objects.filter(
+            recipe_id=recipe_id)[:10],
+        'ingredient_search': Ingredient.objects.filter(
+            name__istartswith='са'),
+    }
+
+
+def explain(queryset):
+    """Return the root plan node of an analyzed run of ``queryset``."""
+    output = queryset.explain(format='json', analyze=True, buffers=True)
+    return json.loads(output)[0]['Plan']
+
+
+def nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from nodes(child)
+
+
+def shape(plan):
+    """Return the plan tree without costs, timings or row counts."""
+    node = [plan['Node Type']]
+    for key in ('Relation Name', 'Index Name'):
+        if key in plan:
+            node.append(plan[key])
+    children = [shape(child) for child in plan.get('Plans', ())]
+    return node + [children] if children else node
+
+
+def _rows_read(plan):
+    loops = plan.get('Actual Loops', 1)
+    return (plan.get('Actual Rows', 0)
+            + plan.get('Rows Removed by Filter', 0)) * loops
+
+
+def _filter_columns(plan):
+    condition = plan.get('Filter', '')
+    columns = []
+    for column in COLUMN.findall(condition):
+        if condition.startswith('(upper(') and '~~' in condition:
+            # istartswith, only an expression index with pattern ops helps.
+            column = f'UPPER({column}::text) text_pattern_ops'
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+def _scanned_relation(plan):
+    for node in nodes(plan):
+        if 'Relation Name' in node:
+            return node
+    return None
+
+
+def findings(plan, min_rows=1000):
+    """
+    Return ``[(problem, suggested index)]`` for a plan.
+
+    A sequential scan reading at least ``min_rows`` rows suggests an index
+    on its filter columns; a sort over as many rows, or one that spilled to
+    disk, suggests one on the sort key, prefixed by the filter columns of
+    the scan below it. A node whose row estimate is off by ``MISESTIMATE``
+    times is reported too, the planner picked its plan on stale statistics.
+    """
+    found = []
+    for node in nodes(plan):
+        misestimate = _misestimate(node, min_rows)
+        if misestimate:
+            found.append((misestimate, None))
+        if node['Node Type'] == 'Seq Scan':
+            rows = _rows_read(node)
+            if rows < min_rows:
+                continue
+            columns = _filter_columns(node)
+            found.append((
+                f'Seq Scan on {node["Relation Name"]} read {rows} rows',
+                _suggest(node['Relation Name'], columns) if columns else None,
+            ))
+        elif node['Node Type'] == 'Sort':
+            # A top-N sort returns few rows, what it sorted is the input.
+            child = node['Plans'][0]
+            rows = child.get('Actual Rows', 0) * child.get('Actual Loops', 1)
+            spilled = node.get('Sort Space Type') == 'Disk'
+            if rows < min_rows and not spilled:
+                continue
+            scan = _scanned_relation(node)
+            keys = [
+                match.group(1) + (match.group(2) or '')
+                for match in map(SORT_KEY.match, node.get('Sort Key', ()))
+                if match
+            ]
+            problem = (f'Sort on {", ".join(node.get("Sort Key", ()))} '
+                       f'over {rows} rows')
+            if spilled:
+                problem += (f' spilled {node.get("Sort Space Used", 0)} kB '
+                            'to disk')
+            found.append((
+                problem,
+                _suggest(scan['Relation Name'],
+                         _filter_columns(scan) + keys) if scan else None,
+            ))
+    return found
+
+
+def _misestimate(node, min_rows):
+    if 'Actual Rows' not in node or not node.get('Actual Loops', 1):
+        return None
+    planned, actual = node['Plan Rows'], node['Actual Rows']
+    if max(planned, actual) * node.get('Actual Loops', 1) < min_rows:
+        return None
+    if max(planned, actual) < MISESTIMATE * max(min(planned, actual), 1):
+        return None
+    where = node['Node Type']
+    if 'Relation Name' in node:
+        where += f' on {node["Relation Name"]}'
+    return (f'{where} estimated {planned} rows, got {actual}, '
+            'ANALYZE may be due')
+
+
+def _suggest(relation, columns):
+    name = '_'.join([relation] + [
+        re.sub(r'\W+', '_', column.split('::')[0]).strip('_').lower()
+        for column in columns]) + '_idx'
+    return (f'CREATE INDEX CONCURRENTLY {name[:63]} '
+            f'ON {relation} ({", ".join(columns)});')
+
+
+def compare(shapes, snapshot):
+    """Return names of queries whose plan shape moved off the snapshot."""
+    return [
+        name for name, plan_shape in shapes.items()
+        if name in snapshot and snapshot[name] != plan_shape
+    ]
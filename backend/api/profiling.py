@@ -0,0 +1,141 @@
+"""
+On-demand request profiling.
+
+A profiled request runs under ``cProfile`` with ``tracemalloc`` snapshots
+taken around it. The pstats dump and a JSON summary with the top
+allocation differences are written to ``PROFILING_DIR``, which keeps only
+the ``PROFILING_MAX_FILES`` newest captures.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+
+PROFILE_ID = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+
+
+def _path(profile_id, extension):
+    return os.path.join(settings.PROFILING_DIR, f'{profile_id}.{extension}')
+
+
+def is_profile_id(value):
+    return bool(PROFILE_ID.match(value))
+
+
+def capture(request, get_response, expose=False):
+    """
+    Run ``get_response`` under the profilers and store the result.
+
+    With ``expose`` the response names the capture in ``X-Profile-Id``.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+    before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        response = profiler.runcall(get_response, request)
+    finally:
+        duration = time.perf_counter() - start
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if started:
+            tracemalloc.stop()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    allocations = after.filter_traces(ignore).compare_to(
+        before.filter_traces(ignore), 'lineno')
+    profile_id = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+    store(profile_id, profiler, {
+        'id': profile_id,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration': round(duration, 6),
+        'peak_memory': peak,
+        'allocations': [
+            {
+                'location': str(stat.traceback),
+                'size_diff': stat.size_diff,
+                'count_diff': stat.count_diff,
+            }
+            for stat in allocations[:settings.PROFILING_TOP_ALLOCATIONS]
+        ],
+    })
+    if expose:
+        response['X-Profile-Id'] = profile_id
+    return response
+
+
+def store(profile_id, profiler, summary):
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(_path(profile_id, 'prof'))
+    with open(_path(profile_id, 'json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f)
+    for stale in list_ids()[settings.PROFILING_MAX_FILES:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(_path(stale, extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_ids():
+    """Return stored profile ids, newest first."""
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-len('.json')] for name in names if name.endswith('.json')]
+    return sorted(ids, key=lambda pk: int(pk.split('-')[0]), reverse=True)
+
+
+def summary(profile_id):
+    with open(_path(profile_id, 'json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def dump_path(profile_id):
+    return _path(profile_id, 'prof')
+
+
+def report(profile_id, limit=40, sort='cumulative'):
+    """Return the pstats text report of a profile."""
+    output = io.StringIO()
+    stats = pstats.Stats(dump_path(profile_id), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def _function_times(profile_id):
+    stats = pstats.Stats(dump_path(profile_id)).strip_dirs().stats
+    return {
+        pstats.func_std_string(func): (calls, total, cumulative)
+        for func, (_, calls, total, cumulative, _) in stats.items()
+    }
+
+
+def diff(profile_id, other_id, limit=40):
+    """Return functions whose own time changed most between two profiles."""
+    first = _function_times(profile_id)
+    second = _function_times(other_id)
+    rows = []
+    for func in first.keys() | second.keys():
+        calls, total, cumulative = first.get(func, (0, 0, 0))
+        other_calls, other_total, other_cumulative = second.get(
+            func, (0, 0, 0))
+        rows.append({
+            'function': func,
+            'calls_diff': other_calls - calls,
+            'total_time_diff': round(other_total - total, 6),
+            'cumulative_time_diff': round(other_cumulative - cumulative, 6),
+        })
+    rows.sort(key=lambda row: abs(row['total_time_diff']), reverse=True)
+    return rows[:limit]
@@ -1,8 +1,17 @@
+import pstats
+
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
-from users.models import CustomUser, Follow
+from api.export import FORMATS
+from api.fieldsets import SparseFieldsetMixin
+from recipes import shopping_list, sync
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem, Tag)
+from users.models import CustomUser
+from users import memberships
 from users.serializers import UserSerializer
 
 
@@ -26,6 +35,87 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'color', 'slug')
 
 
+class TagFacetSerializer(TagSerializer):
+    """
+    Serializer for tag counts of the facets endpoint.
+    """
+
+    count = serializers.SerializerMethodField()
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('count',)
+
+    def get_count(self, obj):
+        return self.context['counts'].get(obj.id, 0)
+
+
+class IdListField(serializers.Field):
+    """
+    Comma separated list of ids.
+    """
+
+    default_error_messages = {
+        'invalid': _('Expected comma separated ids.'),
+    }
+
+    def to_internal_value(self, data):
+        try:
+            return [int(pk) for pk in str(data).split(',') if pk]
+        except ValueError:
+            self.fail('invalid')
+
+    def to_representation(self, value):
+        return ','.join(map(str, value))
+
+
+class PantrySerializer(serializers.Serializer):
+    """
+    Serializer for pantry match query parameters.
+    """
+
+    ingredients = IdListField()
+    exclude = IdListField(required=False, default=list)
+    max_missing = serializers.IntegerField(
+        min_value=0, max_value=10, default=2
+    )
+
+
+class ExportSerializer(serializers.Serializer):
+    """
+    Serializer for export query parameters.
+    """
+
+    output = serializers.ChoiceField(choices=FORMATS, default='ndjson')
+    gzip = serializers.BooleanField(default=False)
+    since = serializers.DateTimeField(required=False)
+    since_id = serializers.IntegerField(required=False, min_value=0)
+
+
+class ChangesSerializer(serializers.Serializer):
+    """
+    Serializer for recipe changes query parameters.
+    """
+
+    since = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=100)
+
+    def validate_since(self, value):
+        try:
+            return sync.decode_token(value)
+        except ValueError:
+            raise serializers.ValidationError(_('Invalid sync token.'))
+
+
+class ProfileReportSerializer(serializers.Serializer):
+    """
+    Serializer for profile report query parameters.
+    """
+
+    sort = serializers.ChoiceField(
+        choices=[key.value for key in pstats.SortKey], default='cumulative'
+    )
+
+
 class AmountIngredientSerializer(serializers.ModelSerializer):
     """
     Serializer for amount ingredient.
@@ -54,7 +144,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for recipe list endpoint.
     """
@@ -85,19 +175,12 @@ class RecipeListSerializer(serializers.ModelSerializer):
         return AmountIngredientSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Recipe.objects.filter(favorites__user=user, id=obj.id).exists()
+        request = self.context.get('request')
+        return obj.id in memberships.for_request(request).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Recipe.objects.filter(
-            shopping_cart__user=user,
-            id=obj.id
-        ).exists()
+        request = self.context.get('request')
+        return obj.id in memberships.for_request(request).cart
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -155,6 +238,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             all_ingredients.append(new_ingredient)
         RecipeIngredient.objects.bulk_create(all_ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -163,13 +247,16 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.add_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance.tags.clear()
         tags = validated_data.pop('tags')
         instance.tags.set(tags)
+        old_totals = shopping_list.recipe_totals(instance.id)
         RecipeIngredient.objects.filter(recipe=instance).delete()
         ingredients = validated_data.pop('ingredients')
         self.add_ingredients(instance, ingredients)
+        shopping_list.update_recipe(instance.id, old_totals)
         return super().update(instance, validated_data)
 
     def to_representation(self, recipe):
@@ -190,7 +277,17 @@ class MinRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer for shopping list endpoint.
+    """
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('name', 'measurement_unit', 'amount')
+
+
+class FollowSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for following endpoint.
     """
@@ -213,8 +310,8 @@ class FollowSerializer(serializers.ModelSerializer):
                             'recipes_count')
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return Follow.objects.filter(user=user, author=obj.id).exists()
+        request = self.context.get('request')
+        return obj.author_id in memberships.for_request(request).follows
 
     def get_recipes(self, obj):
         request = self.context.get('request')
@@ -0,0 +1,129 @@
+import fcntl
+import os
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class ActionScopedRateThrottle(ScopedRateThrottle):
+    """
+    Scoped throttle which picks its scope from the view action.
+
+    Views declare ``throttle_scopes = {action: scope}``; rates for the
+    scopes live in ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`` and are
+    read per request, so a scope set to None is not throttled. Requests
+    are keyed by user id, or by client IP for anonymous users.
+    """
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        scopes = getattr(view, 'throttle_scopes', {})
+        self.scope = scopes.get(getattr(view, 'action', None))
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super(ScopedRateThrottle, self).allow_request(request, view)
+
+
+class ServiceBusy(APIException):
+    """Raised when a concurrency scope has no free slots."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Server is busy, try again later.')
+    default_code = 'service_busy'
+
+    def __init__(self, wait=None, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class ConcurrencySlot:
+    """
+    Cross-worker semaphore built on ``flock`` over a set of slot files.
+
+    Every scope owns ``limit`` files in ``CONCURRENCY_LOCK_DIR``; holding
+    an exclusive lock on one of them is holding a slot. Locks belong to
+    the open file, so they are dropped by the kernel if a worker dies.
+    """
+
+    def __init__(self, scope, limit):
+        self.scope = scope
+        self.limit = limit
+        self._fd = None
+
+    def _path(self, index):
+        return os.path.join(
+            settings.CONCURRENCY_LOCK_DIR, f'{self.scope}.{index}.lock'
+        )
+
+    def acquire(self):
+        os.makedirs(settings.CONCURRENCY_LOCK_DIR, exist_ok=True)
+        for index in range(self.limit):
+            fd = os.open(self._path(index), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            self._fd = fd
+            return True
+        return False
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ConcurrencyLimitMixin:
+    """
+    Caps how many requests of a given action run at once across workers.
+
+    Views declare ``concurrency_limits = {action: scope}``; the number of
+    slots per scope comes from ``settings.CONCURRENCY_LIMITS``. The slot is
+    taken after authentication, permissions and throttling, so rejected
+    requests never occupy it, and is released once the response is built,
+    or when the view raises an error DRF does not turn into a response.
+    """
+
+    concurrency_limits = {}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        scope = self.concurrency_limits.get(self.action)
+        limit = settings.CONCURRENCY_LIMITS.get(scope)
+        if not limit:
+            return
+        slot = ConcurrencySlot(scope, limit)
+        if not slot.acquire():
+            raise ServiceBusy(wait=settings.CONCURRENCY_RETRY_AFTER)
+        self._concurrency_slot = slot
+
+    def _release_slot(self):
+        slot = getattr(self, '_concurrency_slot', None)
+        if slot is not None:
+            slot.release()
+            self._concurrency_slot = None
+
+    def handle_exception(self, exc):
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # Re-raised past finalize_response, the slot is released here.
+            self._release_slot()
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        self._release_slot()
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -12,7 +12,9 @@ router.register(
     r'ingredients', views.IngredientViewSet, basename='ingredients'
 )
 router.register(r'tags', views.TagViewSet, basename='tags')
+router.register(r'profiles', views.ProfileViewSet, basename='profiles')
 
 urlpatterns = [
+    path('export/<str:table>/', views.ExportView.as_view(), name='export'),
     path('', include(router.urls)),
 ]
@@ -1,24 +1,33 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from django_filters.utils import translate_validation
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api import (conditional, documents, export, fieldsets, metrics, pdf,
+                 profiling)
 from api.filters import AuthorAndTagFilter, IngredientSearchFilter
 from api.pagination import LimitPageNumberPagination
-from api.permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from api.permissions import (IsAdminOrMetricsToken, IsAdminOrReadOnly,
+                             IsOwnerOrReadOnly)
+from api.throttling import ConcurrencyLimitMixin
+from recipes import sync
+from recipes.facets import bucket_bounds, facet_index
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, SimilarRecipe, Tag)
 
-from .serializers import (IngredientSerializer, MinRecipeSerializer,
-                          RecipeCreateSerializer, RecipeListSerializer,
-                          TagSerializer)
+from .serializers import (ChangesSerializer, ExportSerializer,
+                          IngredientSerializer, MinRecipeSerializer,
+                          PantrySerializer, ProfileReportSerializer,
+                          RecipeCreateSerializer,
+                          RecipeListSerializer, ShoppingListItemSerializer,
+                          TagFacetSerializer, TagSerializer)
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -39,7 +48,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConcurrencyLimitMixin, viewsets.ModelViewSet):
     """Recipe view."""
 
     actions_list = ['POST', 'PATCH']
@@ -48,6 +57,62 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsOwnerOrReadOnly,)
     pagination_class = LimitPageNumberPagination
     filter_class = AuthorAndTagFilter
+    throttle_scopes = {
+        'list': 'recipes',
+        'pantry': 'recipes',
+        'facets': 'recipes',
+        'changes': 'recipes',
+        'download_shopping_cart': 'shopping_list',
+    }
+    concurrency_limits = {
+        'list': 'listing',
+        'pantry': 'listing',
+        'changes': 'listing',
+        'download_shopping_cart': 'pdf',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        if documents.usable(self.request):
+            return queryset.only(*documents.PAGE_FIELDS)
+        if not fieldsets.requested(self.request, 'text'):
+            queryset = queryset.defer('text')
+        if fieldsets.requested(self.request, 'author'):
+            return queryset.select_related('author')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        etag = conditional.make_etag(
+            page, request.user, self.paginator.page.paginator.count,
+            fieldsets.shape(request)
+        )
+        response = conditional.not_modified(request, etag)
+        if response is None:
+            response = self.get_paginated_response(self.represent(page))
+        return conditional.set_validators(
+            response, etag, conditional.last_modified(page)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = conditional.make_etag(
+            [instance], request.user, fieldsets.shape(request))
+        modified = conditional.last_modified([instance])
+        response = conditional.not_modified(
+            request, etag, modified if request.user.is_anonymous else None
+        )
+        if response is None:
+            response = Response(self.represent([instance])[0])
+        return conditional.set_validators(response, etag, modified)
+
+    def represent(self, recipes):
+        if documents.usable(self.request):
+            return documents.render(recipes, self.request)
+        return self.get_serializer(recipes, many=True).data
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -75,38 +140,96 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.delete_obj(ShoppingCart, request, pk)
         return None
 
+    @action(detail=False, methods=['get'])
+    def pantry(self, request):
+        params = PantrySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        # numpy is imported on first use, see foodgram/startup.py.
+        from recipes.pantry import pantry_index
+        recipe_ids = pantry_index.match(**params.validated_data)
+        page = self.paginate_queryset(recipe_ids)
+        recipes = Recipe.objects.in_bulk(page)
+        serializer = RecipeListSerializer(
+            [recipes[pk] for pk in page if pk in recipes], many=True,
+            context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        filterset = AuthorAndTagFilter(
+            request.query_params, queryset=Recipe.objects.none(),
+            request=request
+        )
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        count, tag_counts, time_counts = facet_index.count(
+            **filterset.facet_selection())
+        tags = TagFacetSerializer(
+            Tag.objects.all(), many=True, context={'counts': tag_counts}
+        )
+        return Response({
+            'count': count,
+            'tags': tags.data,
+            'cooking_time': [
+                {'min': low, 'max': high, 'count': bucket_count}
+                for (low, high), bucket_count in zip(bucket_bounds(),
+                                                     time_counts)
+            ],
+        })
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        params = ChangesSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        batch = sync.read(params.validated_data.get('since', 0),
+                          params.validated_data['limit'])
+        recipes = Recipe.objects.in_bulk(batch.saved)
+        serializer = RecipeListSerializer(
+            [recipes[pk] for pk in batch.saved if pk in recipes], many=True,
+            context=self.get_serializer_context()
+        )
+        return Response({
+            'next': sync.encode_token(batch.position),
+            'has_more': batch.has_more,
+            'results': serializer.data,
+            'deleted': batch.deleted,
+        })
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        recipes = [
+            item.similar for item in SimilarRecipe.objects.filter(
+                recipe_id=pk).select_related('similar')
+        ]
+        if not recipes:
+            get_object_or_404(Recipe, id=pk)
+        serializer = MinRecipeSerializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated])
+    def shopping_list(self, request):
+        items = ShoppingListItem.objects.filter(user=request.user)
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user).values_list(
-                'ingredient__name',
-                'ingredient__measurement_unit',
-        ).annotate(count=Sum('amount'))
-        pdfmetrics.registerFont(
-            TTFont('DejaVuSans', 'DejaVuSans.ttf', 'UTF-8'))
-        response = HttpResponse(content_type='application/pdf')
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user).values_list(
+                'name', 'measurement_unit', 'amount')
+        response = HttpResponse(pdf.shopping_list_content(ingredients),
+                                content_type='application/pdf')
         response['Content-Disposition'] = ('attachment; '
                                            'filename="shopping_list.pdf"')
-        page = canvas.Canvas(response)
-        page.setFont('DejaVuSans', size=20)
-        page.drawString(230, 770, 'Ingredients list')
-        page.setFont('DejaVuSans', size=12)
-        height = 650
-        for ingredient in ingredients:
-            page.drawString(
-                60, height,
-                ('{} ({}) - {}'.format(*ingredient))
-            )
-            height -= 20
-        page.showPage()
-        page.save()
         return response
 
     def add_obj(self, model, request, pk):
         if model.objects.filter(user=request.user, recipe__id=pk).exists():
             return Response({
-                _('message'): _('Recipe is already in a list')
+                'message': _('Recipe is already in a list')
             }, status=status.HTTP_400_BAD_REQUEST)
         recipe = get_object_or_404(Recipe, id=pk)
         model.objects.create(user=request.user, recipe=recipe)
@@ -114,10 +237,99 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_obj(self, model, request, pk):
-        obj = model.objects.filter(user=request.user, recipe__id=pk)
-        if obj.exists():
+        # Loaded with the recipe, signal receivers need its author.
+        obj = model.objects.filter(
+            user=request.user, recipe__id=pk).select_related('recipe').first()
+        if obj is not None:
             obj.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({
-            _('message'): _('Recipe has already been deleted')
+            'message': _('Recipe has already been deleted')
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ExportView(APIView):
+    """Streaming table export view."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, table):
+        if table not in export.EXPORTS:
+            raise Http404
+        params = ExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        output_format = params.validated_data['output']
+        compress = params.validated_data['gzip']
+        try:
+            chunks = export.stream(
+                table, output_format, compress,
+                since=params.validated_data.get('since'),
+                since_id=params.validated_data.get('since_id'),
+            )
+        except export.ExportError as error:
+            raise ValidationError({'since': str(error)})
+        response = StreamingHttpResponse(
+            chunks, content_type=export.CONTENT_TYPES[output_format])
+        if compress:
+            # The body stays an ndjson or csv file to clients decoding it.
+            response['Content-Encoding'] = 'gzip'
+        response['Content-Disposition'] = (
+            f'attachment; filename="{table}.{output_format}"'
+        )
+        return response
+
+
+class MetricsView(APIView):
+    """Metrics of all workers in the Prometheus text format."""
+
+    permission_classes = (IsAdminOrMetricsToken,)
+
+    def get(self, request):
+        return HttpResponse(metrics.exposition(),
+                            content_type='text/plain; version=0.0.4')
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """Captured request profiles view."""
+
+    permission_classes = (IsAdminUser,)
+    lookup_value_regex = r'[0-9]+-[0-9a-f]{8}'
+
+    def get_profile_id(self, pk):
+        if not profiling.is_profile_id(pk) or pk not in profiling.list_ids():
+            raise Http404
+        return pk
+
+    def list(self, request):
+        summaries = []
+        for profile_id in profiling.list_ids():
+            try:
+                summary = profiling.summary(profile_id)
+            except FileNotFoundError:
+                continue
+            summary.pop('allocations', None)
+            summaries.append(summary)
+        return Response(summaries)
+
+    def retrieve(self, request, pk=None):
+        profile_id = self.get_profile_id(pk)
+        params = ProfileReportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        summary = profiling.summary(profile_id)
+        summary['report'] = profiling.report(
+            profile_id, sort=params.validated_data['sort'])
+        return Response(summary)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        profile_id = self.get_profile_id(pk)
+        return FileResponse(
+            open(profiling.dump_path(profile_id), 'rb'),
+            as_attachment=True, filename=f'{profile_id}.prof'
+        )
+
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        profile_id = self.get_profile_id(pk)
+        other_id = self.get_profile_id(request.query_params.get('other', ''))
+        return Response(profiling.diff(profile_id, other_id))
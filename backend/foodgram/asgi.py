@@ -2,6 +2,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Routes the slow read views to their async wrappers.
+os.environ.setdefault('ROOT_URLCONF', 'foodgram.asgi_urls')
 
 application = get_asgi_application()
@@ -0,0 +1,5 @@
+from api.async_views import asyncify
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = asyncify(sync_urlpatterns)
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from datetime import datetime, timezone
 
 from dotenv import load_dotenv
 
@@ -19,9 +21,9 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'users',
+    'users.apps.UsersConfig',
     'api',
-    'recipes',
+    'recipes.apps.RecipesConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -29,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,9 +39,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ProfilingMiddleware',
 ]
 
-ROOT_URLCONF = 'foodgram.urls'
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', default='foodgram.urls')
 
 TEMPLATES = [
     {
@@ -58,6 +62,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Threads running the async views under ASGI, each holds a DB connection.
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', default=8))
+ASYNC_RENDER_THREADS = int(os.getenv('ASYNC_RENDER_THREADS', default=2))
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
@@ -69,6 +77,28 @@ DATABASES = {
     }
 }
 
+CACHE_DIR = os.getenv(
+    'CACHE_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram-cache')
+)
+CACHES = {
+    'default': {
+        'BACKEND': 'api.cache.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'ALIAS': 'default',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'local': {
+        'BACKEND': 'api.cache.LocMemCache',
+        'LOCATION': 'local',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+# Seconds a worker may see other workers' deletes late, see api.cache.
+CACHE_FRONT_TIMEOUT = int(os.getenv('CACHE_FRONT_TIMEOUT', default=5))
+# Longest wait for a value another request is computing.
+CACHE_LOCK_TIMEOUT = 30
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -100,6 +130,15 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+MEDIA_BLOB_GRACE = int(os.getenv('MEDIA_BLOB_GRACE', default=24 * 3600))
+MEDIA_QUARANTINE_DIR = os.getenv(
+    'MEDIA_QUARANTINE_DIR',
+    default=os.path.join(BASE_DIR, 'media_quarantine')
+)
+# Seconds quarantined files are kept before sweep_media deletes them.
+MEDIA_QUARANTINE_RETENTION = int(
+    os.getenv('MEDIA_QUARANTINE_RETENTION', default=30 * 24 * 3600))
+
 AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
@@ -110,9 +149,68 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-    ]
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.ActionScopedRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'recipes': os.getenv('THROTTLE_RECIPES', default='120/min'),
+        'shopping_list': os.getenv('THROTTLE_SHOPPING_LIST', default='10/min'),
+        'subscriptions': os.getenv('THROTTLE_SUBSCRIPTIONS', default='60/min'),
+        'users': os.getenv('THROTTLE_USERS', default='120/min'),
+    },
 }
 
+CONCURRENCY_LOCK_DIR = os.getenv(
+    'CONCURRENCY_LOCK_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram-slots')
+)
+CONCURRENCY_LIMITS = {
+    'pdf': int(os.getenv('CONCURRENCY_PDF', default=2)),
+    'listing': int(os.getenv('CONCURRENCY_LISTING', default=8)),
+}
+CONCURRENCY_RETRY_AFTER = 5
+
+SIMILAR_RECIPES_COUNT = 10
+
+SUGGESTED_AUTHORS_COUNT = 20
+
+SUGGESTIONS_ACTIVITY_DAYS = 30
+
+RECIPE_INDEX_TTL = int(os.getenv('RECIPE_INDEX_TTL', default=60))
+
+RECIPE_CHANGES_DELAY = int(os.getenv('RECIPE_CHANGES_DELAY', default=5))
+
+TRENDING_HALF_LIFE_DAYS = 7
+TRENDING_EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+AUTHOR_STATS_TIMEOUT = 60 * 60
+# Seconds expired stats are still served while one request recomputes.
+AUTHOR_STATS_STALE = 10 * 60
+
+RECIPE_PAGE_CACHE_TIMEOUT = 10 * 60
+
+SHOPPING_LIST_CACHE_TIMEOUT = 10 * 60
+
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram-profiles')
+)
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', default=0))
+PROFILING_MAX_FILES = 50
+PROFILING_TOP_ALLOCATIONS = 25
+PROFILING_TRACEMALLOC_FRAMES = 1
+
+METRICS_DIR = os.getenv(
+    'METRICS_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
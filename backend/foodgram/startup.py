@@ -0,0 +1,65 @@
+"""
+Process start-up helpers.
+
+With ``preload_app`` gunicorn imports the project once in the master and
+forks workers from it. ``warm_up()`` builds the lazily created state
+there as well, so workers share those pages copy-on-write instead of
+each building its own copy on the first request.
+"""
+import gc
+import logging
+
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+MEMORY_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty',
+                 'Private_Clean', 'Private_Dirty')
+
+
+def warm_up():
+    """Import heavy modules and build caches ahead of forking."""
+    from api import pdf
+    from recipes.facets import facet_index
+    from recipes.pantry import pantry_index
+
+    get_resolver().url_patterns
+    pdf.preload()
+    try:
+        pantry_index.get()
+        facet_index.get()
+    except DatabaseError:
+        logger.warning('Database unavailable, indexes are built lazily.')
+    finally:
+        # Forked workers must not share the master's connections.
+        connections.close_all()
+    # Keep the collector from touching, and so copying, inherited objects.
+    gc.freeze()
+
+
+def memory_usage():
+    """Return the memory of this process in KiB, split by sharing."""
+    try:
+        with open('/proc/self/smaps_rollup', encoding='ascii') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        import resource
+        return {'MaxRss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    usage = {}
+    for line in lines[1:]:
+        name, value = line.split(':', 1)
+        if name in MEMORY_FIELDS:
+            usage[name] = int(value.split()[0])
+    return usage
+
+
+def format_memory(usage):
+    shared = usage.get('Shared_Clean', 0) + usage.get('Shared_Dirty', 0)
+    private = usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0)
+    if 'Rss' not in usage:
+        return f'max rss {usage["MaxRss"] / 1024:.1f} MiB'
+    return (f'rss {usage["Rss"] / 1024:.1f} MiB, '
+            f'pss {usage["Pss"] / 1024:.1f} MiB, '
+            f'shared {shared / 1024:.1f} MiB, '
+            f'private {private / 1024:.1f} MiB')
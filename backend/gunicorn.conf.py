@@ -0,0 +1,54 @@
+import os
+import time
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+# ASGI mode: uvicorn.workers.UvicornWorker with foodgram.asgi:application
+# as the app, see the compare_servers command.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+# Import the project once in the master; workers fork from it.
+preload_app = True
+# Recycle workers to bound memory growth, restarts are cheap when preloaded.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+
+def when_ready(server):
+    from api import metrics
+    from foodgram.startup import format_memory, memory_usage, warm_up
+
+    metrics.reset()
+    start = time.perf_counter()
+    warm_up()
+    server.log.info('Warmed up in %.2fs, master %s',
+                    time.perf_counter() - start,
+                    format_memory(memory_usage()))
+
+
+def post_fork(server, worker):
+    from api import metrics
+
+    worker.forked_at = time.perf_counter()
+    metrics.share()
+
+
+def post_worker_init(worker):
+    from foodgram.startup import format_memory, memory_usage
+
+    worker.log.info('Worker %s ready in %.3fs, %s', worker.pid,
+                    time.perf_counter() - worker.forked_at,
+                    format_memory(memory_usage()))
+
+
+def worker_exit(server, worker):
+    from foodgram.startup import format_memory, memory_usage
+
+    server.log.info('Worker %s exiting after %s requests, %s', worker.pid,
+                    worker.nr, format_memory(memory_usage()))
+
+
+def child_exit(server, worker):
+    from api import metrics
+
+    metrics.merge(worker.pid)
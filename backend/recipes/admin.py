@@ -1,6 +1,11 @@
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
-from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from api.pagination import EstimatedCountPaginator
+
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart, Tag,
+                     UnitConversion)
 
 
 @admin.register(Tag)
@@ -11,17 +16,53 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
+    search_fields = ('^name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'author', 'count_favorites')
-    list_filter = ('author', 'name', 'tags')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__email', 'author__username')
+    autocomplete_fields = ('author',)
+    readonly_fields = ('pub_date', 'updated_at', 'revision', 'popularity',
+                       'trending')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        favorites = Favorite.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            count=Count('pk')).values('count')
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(
+                Subquery(favorites), 0, output_field=IntegerField()
+            )
+        )
 
     def count_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+    count_favorites.admin_order_field = 'favorites_count'
+
+
+@admin.register(UnitConversion)
+class UnitConversionAdmin(admin.ModelAdmin):
+    list_display = ('unit', 'base_unit', 'factor')
+
+
+class UserRecipeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipe', 'created')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__email', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
-admin.site.register(ShoppingCart)
-admin.site.register(Favorite)
+admin.site.register(ShoppingCart, UserRecipeAdmin)
+admin.site.register(Favorite, UserRecipeAdmin)
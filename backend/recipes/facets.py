@@ -0,0 +1,181 @@
+"""
+Recipe counts per tag and cooking time for the filter sidebar.
+
+The index keeps the id set of the recipes of every tag, author and
+cooking time bucket. Counting under a selection is an intersection of
+the selected sets with each facet set, no database access involved.
+
+Writes are applied in place: the index remembers its position in the
+recipe change log (``recipes.sync``) and reloads just the recipes logged
+after it. Recent log rows are read again on every update, since a slow
+transaction may still commit a lower id, see ``sync``.
+"""
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .indexes import RecipeIndex
+from .models import Recipe, RecipeChange, TagRecipe
+
+# Upper bounds of the cooking time buckets in minutes, the last is open.
+COOKING_TIME_BUCKETS = (15, 30, 60)
+# Beyond this many changed recipes a rebuild is cheaper than patching.
+MAX_UPDATE = 1000
+
+FACETS = ('tags', 'authors', 'buckets')
+
+Facets = namedtuple('Facets', 'position recipes everything tags authors '
+                              'buckets')
+
+
+def bucket(cooking_time):
+    for index, bound in enumerate(COOKING_TIME_BUCKETS):
+        if cooking_time < bound:
+            return index
+    return len(COOKING_TIME_BUCKETS)
+
+
+def bucket_bounds():
+    """Return ``(min, max)`` of every bucket, max is None for the last."""
+    lower = (0,) + COOKING_TIME_BUCKETS
+    upper = COOKING_TIME_BUCKETS + (None,)
+    return list(zip(lower, upper))
+
+
+def _settled_position(rows):
+    """Last log id old enough that no lower id can still commit."""
+    horizon = timezone.now() - timedelta(
+        seconds=settings.RECIPE_CHANGES_DELAY)
+    settled = [pk for pk, created in rows if created <= horizon]
+    return max(settled) if settled else None
+
+
+def _load(recipe_ids=None):
+    """Return ``{id: (author_id, bucket, tag_ids)}`` read from the DB."""
+    recipes = Recipe.objects.order_by()
+    tag_pairs = TagRecipe.objects.order_by()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+        tag_pairs = tag_pairs.filter(recipe_id__in=recipe_ids)
+    tags = defaultdict(list)
+    for recipe_id, tag_id in tag_pairs.values_list('recipe_id', 'tag_id'):
+        tags[recipe_id].append(tag_id)
+    return {
+        pk: (author_id, bucket(cooking_time), tuple(tags[pk]))
+        for pk, author_id, cooking_time in recipes.values_list(
+            'id', 'author_id', 'cooking_time')
+    }
+
+
+def _facet_keys(row):
+    author_id, time_bucket, tag_ids = row
+    return {'authors': (author_id,), 'buckets': (time_bucket,),
+            'tags': tag_ids}
+
+
+def _frozen(sets):
+    return {key: frozenset(ids) for key, ids in sets.items()}
+
+
+def _patch(data, changed, old_rows, fresh):
+    """Return the facet sets of ``data`` with ``changed`` recipes reloaded."""
+    touched = {name: set() for name in FACETS}
+    added = {name: defaultdict(set) for name in FACETS}
+    for row in old_rows:
+        for name, keys in _facet_keys(row).items():
+            touched[name].update(keys)
+    for pk, row in fresh.items():
+        for name, keys in _facet_keys(row).items():
+            touched[name].update(keys)
+            for key in keys:
+                added[name][key].add(pk)
+    facets = {}
+    for name in FACETS:
+        facets[name] = dict(getattr(data, name))
+        for key in touched[name]:
+            ids = (facets[name].get(key, frozenset()) - changed
+                   | added[name][key])
+            if ids:
+                facets[name][key] = ids
+            else:
+                # A rebuild has no key for a tag or author left empty.
+                facets[name].pop(key, None)
+    return facets
+
+
+class FacetIndex(RecipeIndex):
+
+    def build(self):
+        horizon = timezone.now() - timedelta(
+            seconds=settings.RECIPE_CHANGES_DELAY)
+        position = RecipeChange.objects.filter(
+            created__lte=horizon).aggregate(last=Max('id'))['last'] or 0
+        recipes = _load()
+        facets = {name: defaultdict(set) for name in FACETS}
+        for pk, row in recipes.items():
+            for name, keys in _facet_keys(row).items():
+                for key in keys:
+                    facets[name][key].add(pk)
+        return Facets(
+            position=position,
+            recipes=recipes,
+            everything=frozenset(recipes),
+            **{name: _frozen(sets) for name, sets in facets.items()},
+        )
+
+    def update(self, data):
+        rows = list(RecipeChange.objects.filter(
+            id__gt=data.position).values_list('id', 'recipe_id', 'created'))
+        changed = {recipe_id for _, recipe_id, _ in rows}
+        if len(changed) > MAX_UPDATE:
+            return None
+        if not changed:
+            return data
+        # Requests may be reading ``data``: build new sets, never mutate.
+        recipes = dict(data.recipes)
+        fresh = _load(changed)
+        old_rows = [recipes.pop(pk) for pk in changed if pk in recipes]
+        recipes.update(fresh)
+        position = _settled_position(
+            (pk, created) for pk, _, created in rows)
+        return Facets(
+            position=data.position if position is None else position,
+            recipes=recipes,
+            everything=frozenset(recipes),
+            **_patch(data, changed, old_rows, fresh),
+        )
+
+    def count(self, ids=None, tags=None, author=None, within=None):
+        """
+        Return ``(total, {tag_id: count}, [bucket count, ...])``.
+
+        ``tags`` selects recipes with any of the tags, ``within`` limits
+        the selection to a set of ids such as the viewer's favourites.
+        """
+        index = self.get()
+        selected = index.everything
+        if tags:
+            selected = frozenset().union(
+                *(index.tags.get(tag, frozenset()) for tag in tags))
+        if author is not None:
+            selected = selected & index.authors.get(author, frozenset())
+        for limit in (ids, within):
+            if limit is not None:
+                selected = selected & frozenset(limit)
+        if selected is index.everything:
+            matching = len
+        else:
+            def matching(pks):
+                return len(pks & selected)
+        return (
+            len(selected),
+            {tag: matching(pks) for tag, pks in index.tags.items()},
+            [matching(index.buckets.get(position, frozenset()))
+             for position in range(len(COOKING_TIME_BUCKETS) + 1)],
+        )
+
+
+facet_index = FacetIndex()
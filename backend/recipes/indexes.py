@@ -0,0 +1,77 @@
+"""
+In-process indexes over recipes.
+
+Each worker keeps its own copy and rebuilds it lazily once the shared
+version stamp moves or the copy gets older than ``RECIPE_INDEX_TTL``.
+Recipe writes bump the stamp after their transaction commits. Indexes
+that can apply writes to a copy in place implement ``update()``, then
+only the TTL forces a full rebuild.
+
+With a process-local ``default`` cache the stamp would only move for
+writes served by the same worker, the newest ``RecipeChange`` id stands
+for it then.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.cache import is_shared
+
+from .models import RecipeChange
+
+VERSION_KEY = 'recipe-index-version'
+
+
+def invalidate():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def current_version():
+    if is_shared():
+        # A fresh stamp after eviction, copies built before never match.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        return cache.get(VERSION_KEY)
+    return RecipeChange.objects.order_by('-id').values_list(
+        'id', flat=True).first()
+
+
+class RecipeIndex:
+    """Lazily built, versioned in-process index."""
+
+    def __init__(self):
+        self._data = None
+        self._version = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def build(self):
+        raise NotImplementedError
+
+    def update(self, data):
+        """Return ``data`` with recent writes applied, None to rebuild."""
+
+    def _is_fresh(self, version):
+        return (self._data is not None and version == self._version
+                and time.monotonic() - self._built_at
+                < settings.RECIPE_INDEX_TTL)
+
+    def get(self):
+        version = current_version()
+        if not self._is_fresh(version):
+            with self._lock:
+                if not self._is_fresh(version):
+                    self._refresh()
+                    self._version = version
+        return self._data
+
+    def _refresh(self):
+        data = None
+        if (self._data is not None and time.monotonic() - self._built_at
+                < settings.RECIPE_INDEX_TTL):
+            data = self.update(self._data)
+        if data is None:
+            data = self.build()
+            self._built_at = time.monotonic()
+        self._data = data
@@ -0,0 +1,204 @@
+"""
+Reference counting of stored media files.
+
+Each ``MediaBlob`` counts the rows pointing at one file. Counts change in
+the transaction which changes the references; blobs nobody points at are
+deleted by ``collect()`` once they have stayed unused for
+``MEDIA_BLOB_GRACE`` seconds, which covers uploads whose transaction has
+not committed yet.
+
+Files the counts do not know about, uploads from before the counting,
+blobs whose row was lost and ``.upload-*`` leftovers of interrupted
+writes, are found by ``sweep()`` walking the media tree. Files it moved
+to quarantine are deleted by ``purge_quarantine()`` after
+``MEDIA_QUARANTINE_RETENTION`` seconds.
+"""
+import os
+import shutil
+import time
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MediaBlob, Recipe
+from .storage import UPLOAD_PREFIX
+
+
+def add_reference(name):
+    if not name:
+        return
+    updated = MediaBlob.objects.filter(name=name).update(
+        refcount=F('refcount') + 1, updated=timezone.now())
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, refcount=1)
+    except IntegrityError:
+        add_reference(name)
+
+
+def remove_reference(name):
+    if name:
+        MediaBlob.objects.filter(name=name).update(
+            refcount=F('refcount') - 1, updated=timezone.now())
+
+
+def collect(grace=None):
+    """Delete files of unreferenced blobs, return how many were removed."""
+    grace = settings.MEDIA_BLOB_GRACE if grace is None else grace
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    storage = Recipe._meta.get_field('image').storage
+    unused = MediaBlob.objects.filter(refcount__lte=0, updated__lt=cutoff)
+    removed = 0
+    for pk in list(unused.values_list('pk', flat=True)):
+        with transaction.atomic():
+            # Re-checked under the row lock, an upload may have reused it.
+            blob = unused.select_for_update().filter(pk=pk).first()
+            if blob is None:
+                continue
+            storage.delete(blob.name)
+            blob.delete()
+            removed += 1
+    return removed
+
+
+def count_references():
+    """Rebuild every count from the rows referencing files."""
+    counts = {}
+    for name in Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('image', flat=True).iterator():
+        counts[name] = counts.get(name, 0) + 1
+    with transaction.atomic():
+        MediaBlob.objects.exclude(name__in=counts).update(refcount=0)
+        for name, refcount in counts.items():
+            MediaBlob.objects.update_or_create(
+                name=name, defaults={'refcount': refcount})
+    return len(counts)
+
+
+def _files(path):
+    """Yield ``DirEntry`` of the files below ``path``, depth first."""
+    directories = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+    except FileNotFoundError:
+        return
+    for directory in directories:
+        yield from _files(directory)
+
+
+def _orphans(entries, location, cutoff):
+    """Yield ``(name, size)`` of ``entries`` older than ``cutoff`` unused."""
+    candidates = {}
+    for entry in entries:
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime >= cutoff:
+            continue
+        name = os.path.relpath(entry.path, location).replace(os.sep, '/')
+        if entry.name.startswith(UPLOAD_PREFIX):
+            yield name, stat.st_size
+        else:
+            candidates[name] = stat.st_size
+    if not candidates:
+        return
+    # Blobs with a row, referenced or not, are left to ``collect()``.
+    used = set(Recipe.objects.filter(image__in=candidates).values_list(
+        'image', flat=True))
+    used.update(MediaBlob.objects.filter(name__in=candidates).values_list(
+        'name', flat=True))
+    for name, size in candidates.items():
+        if name not in used:
+            yield name, size
+
+
+def _dispose(storage, name, quarantine):
+    path = storage.path(name)
+    try:
+        if quarantine is None:
+            os.remove(path)
+            return
+        target = os.path.join(quarantine, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+        # Retention counts from the move, the file kept its old mtime.
+        os.utime(target)
+    except FileNotFoundError:
+        pass
+
+
+def purge_quarantine(quarantine, retention=None):
+    """
+    Delete files quarantined more than ``retention`` seconds ago.
+
+    Directories left empty are removed too. Returns counts of the run.
+    """
+    if retention is None:
+        retention = settings.MEDIA_QUARANTINE_RETENTION
+    cutoff = time.time() - retention
+    stats = Counter(purged=0, bytes=0)
+    for entry in _files(quarantine):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime >= cutoff:
+                continue
+            os.remove(entry.path)
+        except FileNotFoundError:
+            continue
+        stats['purged'] += 1
+        stats['bytes'] += stat.st_size
+    for directory, _, _ in os.walk(quarantine, topdown=False):
+        if directory != quarantine:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+    return stats
+
+
+def sweep(grace=None, quarantine=None, dry_run=False, batch_size=500,
+          rate=0, log=None):
+    """
+    Remove files below the image directory nothing refers to.
+
+    The tree is read in batches of ``batch_size`` entries, each checked
+    with one query per model; files modified within ``grace`` seconds
+    are kept, an upload may not have committed yet. Orphans are moved
+    below ``quarantine`` when given, else deleted. ``rate`` caps the
+    files examined per second. Returns counts of the run.
+    """
+    grace = settings.MEDIA_BLOB_GRACE if grace is None else grace
+    field = Recipe._meta.get_field('image')
+    storage = field.storage
+    cutoff = time.time() - grace
+    stats = Counter(scanned=0, orphans=0, bytes=0)
+    files = _files(storage.path(field.upload_to))
+    while True:
+        started = time.monotonic()
+        batch = list(islice(files, batch_size))
+        if not batch:
+            return stats
+        stats['scanned'] += len(batch)
+        for name, size in _orphans(batch, storage.location, cutoff):
+            stats['orphans'] += 1
+            stats['bytes'] += size
+            if log is not None:
+                log(name, size)
+            if not dry_run:
+                _dispose(storage, name, quarantine)
+        if rate:
+            time.sleep(max(0, len(batch) / rate
+                           - (time.monotonic() - started)))
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.14 on 2026-10-19 15:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0004_auto_20230205_1803'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitConversion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.CharField(max_length=15, unique=True, verbose_name='Unit')),
+                ('base_unit', models.CharField(max_length=15, verbose_name='Base unit')),
+                ('factor', models.PositiveIntegerField(verbose_name='Factor')),
+            ],
+            options={
+                'verbose_name': 'Unit conversion',
+                'verbose_name_plural': 'Unit conversions',
+                'ordering': ('unit',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Name')),
+                ('measurement_unit', models.CharField(max_length=15, verbose_name='Measurement_unit')),
+                ('amount', models.IntegerField(verbose_name='Amount')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Shopping list item',
+                'verbose_name_plural': 'Shopping list items',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'name', 'measurement_unit'), name='unique shopping list item'),
+        ),
+    ]
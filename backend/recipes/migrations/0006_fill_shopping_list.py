@@ -0,0 +1,53 @@
+from collections import Counter
+
+from django.db import migrations
+
+UNIT_CONVERSIONS = (
+    ('кг', 'г', 1000),
+    ('л', 'мл', 1000),
+    ('kg', 'g', 1000),
+    ('l', 'ml', 1000),
+)
+
+
+def fill_shopping_list(apps, schema_editor):
+    UnitConversion = apps.get_model('recipes', 'UnitConversion')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    UnitConversion.objects.bulk_create(
+        UnitConversion(unit=unit, base_unit=base_unit, factor=factor)
+        for unit, base_unit, factor in UNIT_CONVERSIONS
+    )
+    conversions = {
+        unit: (base_unit, factor)
+        for unit, base_unit, factor in UNIT_CONVERSIONS
+    }
+    totals = {}
+    rows = RecipeIngredient.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).values_list(
+        'recipe__shopping_cart__user_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount')
+    for user_id, name, measurement_unit, amount in rows:
+        base_unit, factor = conversions.get(
+            measurement_unit, (measurement_unit, 1))
+        totals.setdefault(user_id, Counter())[
+            name, base_unit] += amount * factor
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user_id, name=name,
+                         measurement_unit=measurement_unit, amount=amount)
+        for user_id, user_totals in totals.items()
+        for (name, measurement_unit), amount in user_totals.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shopping_list'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_shopping_list, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-19 15:19
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_similar_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Created'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.IntegerField(default=0, verbose_name='Popularity'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, verbose_name='Trending score'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Created'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-pub_date'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-pub_date'], name='recipe_trending_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.14 on 2026-10-19 15:30
+
+from django.db import migrations, models
+
+from recipes.operations import AddIndexConcurrentlyIfPostgres, RunSQLIfPostgres
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0009_recipe_scores'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-id'], name='favorite_user_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_idx'),
+        ),
+        RunSQLIfPostgres(
+            sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS ingredient_name_prefix_idx '
+                'ON recipes_ingredient (UPPER(name::text) text_pattern_ops);',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS ingredient_name_prefix_idx;',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.14 on 2026-10-19 15:32
+
+from django.db import migrations, models
+
+
+def log_existing_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeChange = apps.get_model('recipes', 'RecipeChange')
+    RecipeChange.objects.bulk_create(
+        (RecipeChange(recipe_id=recipe_id) for recipe_id in
+         Recipe.objects.order_by('pub_date').values_list('id', flat=True)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recipe_id', models.IntegerField(verbose_name='Recipe id')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Deleted')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+            ],
+            options={
+                'verbose_name': 'Recipe change',
+                'verbose_name_plural': 'Recipe changes',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipechange',
+            index=models.Index(fields=['recipe_id', '-id'], name='recipe_change_recipe_idx'),
+        ),
+        migrations.RunPython(log_existing_recipes, migrations.RunPython.noop),
+    ]
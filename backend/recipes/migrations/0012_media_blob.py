@@ -0,0 +1,51 @@
+# Generated by Django 3.1.14 on 2026-10-19 15:36
+
+from django.db import migrations, models
+import recipes.storage
+
+
+def count_existing_images(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    MediaBlob = apps.get_model('recipes', 'MediaBlob')
+    counts = {}
+    for name in Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('image', flat=True):
+        counts[name] = counts.get(name, 0) + 1
+    MediaBlob.objects.bulk_create(
+        MediaBlob(name=name, refcount=refcount)
+        for name, refcount in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Name')),
+                ('refcount', models.IntegerField(default=0, verbose_name='References')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated')),
+            ],
+            options={
+                'verbose_name': 'Media blob',
+                'verbose_name_plural': 'Media blobs',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=recipes.storage.ContentHashStorage(), upload_to='recipes/', verbose_name='Image'),
+        ),
+        migrations.AddIndex(
+            model_name='mediablob',
+            index=models.Index(fields=['refcount', 'updated'], name='media_blob_unused_idx'),
+        ),
+        migrations.RunPython(count_existing_images, migrations.RunPython.noop),
+    ]
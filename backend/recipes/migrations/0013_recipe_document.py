@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-19 15:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_media_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipes.recipe')),
+                ('revision', models.PositiveIntegerField(verbose_name='Revision')),
+                ('data', models.TextField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Recipe document',
+                'verbose_name_plural': 'Recipe documents',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.14 on 2026-10-19 16:15
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def mark_computed(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    SimilarRecipe = apps.get_model('recipes', 'SimilarRecipe')
+    Recipe.objects.update(similar_computed_at=Subquery(
+        SimilarRecipe.objects.filter(recipe=OuterRef('pk')).values(
+            'recipe').annotate(computed_at=Max('computed_at')).values(
+            'computed_at')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='similar_computed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Similar recipes computed'),
+        ),
+        migrations.RunPython(mark_computed, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,13 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from users.models import CustomUser
 
+from .storage import ContentHashStorage
+
 
 class Tag(models.Model):
     """Tag model."""
@@ -57,6 +61,19 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def touch(self):
+        """Bump revision of recipes whose representation has changed."""
+        recipe_ids = list(self.values_list('id', flat=True))
+        RecipeChange.objects.bulk_create(
+            RecipeChange(recipe_id=recipe_id) for recipe_id in recipe_ids
+        )
+        return Recipe.objects.filter(id__in=recipe_ids).update(
+            revision=F('revision') + 1, updated_at=timezone.now()
+        )
+
+
 class Recipe(models.Model):
     """Recipe model."""
 
@@ -68,6 +85,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         _('Image'),
         upload_to='recipes/',
+        storage=ContentHashStorage(),
         null=True, blank=True
     )
     text = models.TextField(_('Describing'),)
@@ -91,15 +109,55 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         _('Public date'), auto_now_add=True
     )
+    updated_at = models.DateTimeField(_('Updated'), auto_now=True)
+    revision = models.PositiveIntegerField(_('Revision'), default=1)
+    popularity = models.IntegerField(_('Popularity'), default=0)
+    trending = models.FloatField(_('Trending score'), default=0)
+    similar_computed_at = models.DateTimeField(
+        _('Similar recipes computed'), null=True, blank=True, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    COMPUTED_FIELDS = {'popularity', 'trending', 'similar_computed_at'}
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = _('Recipe')
         verbose_name_plural = _('Recipes')
+        indexes = [
+            models.Index(fields=('-popularity', '-pub_date'),
+                         name='recipe_popularity_idx'),
+            models.Index(fields=('-trending', '-pub_date'),
+                         name='recipe_trending_idx'),
+            models.Index(fields=('-pub_date',), name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and not kwargs.get(
+                'force_insert') and kwargs.get('update_fields') is None:
+            # Written by their own UPDATEs, the values loaded with the
+            # recipe may be stale and would undo concurrent changes.
+            skipped = self.COMPUTED_FIELDS | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        update_fields = kwargs.get('update_fields')
+        bump = not self._state.adding and (
+            update_fields is None or 'revision' in update_fields)
+        if bump:
+            # Bumped in the UPDATE, concurrent saves never share a revision.
+            self.revision = F('revision') + 1
+        super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=['revision'])
+
 
 class RecipeIngredient(models.Model):
     """RecipeIngredient model."""
@@ -162,6 +220,7 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='shopping_cart',
     )
+    created = models.DateTimeField(_('Created'), auto_now_add=True)
 
     class Meta:
         ordering = ('-id',)
@@ -186,6 +245,7 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favorites',
     )
+    created = models.DateTimeField(_('Created'), auto_now_add=True)
 
     class Meta:
         ordering = ('-id',)
@@ -195,3 +255,138 @@ class Favorite(models.Model):
             models.UniqueConstraint(fields=('user', 'recipe',),
                                     name='unique favorite')
         ]
+        indexes = [
+            models.Index(fields=('user', '-id'), name='favorite_user_idx'),
+        ]
+
+
+class UnitConversion(models.Model):
+    """UnitConversion model."""
+
+    unit = models.CharField(_('Unit'), max_length=15, unique=True)
+    base_unit = models.CharField(_('Base unit'), max_length=15)
+    factor = models.PositiveIntegerField(_('Factor'))
+
+    class Meta:
+        ordering = ('unit',)
+        verbose_name = _('Unit conversion')
+        verbose_name_plural = _('Unit conversions')
+
+    def __str__(self):
+        return f'1 {self.unit} = {self.factor} {self.base_unit}'
+
+
+class ShoppingListItem(models.Model):
+    """ShoppingListItem model."""
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    name = models.CharField(_('Name'), max_length=200)
+    measurement_unit = models.CharField(
+        _('Measurement_unit'), max_length=15)
+    amount = models.IntegerField(_('Amount'))
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = _('Shopping list item')
+        verbose_name_plural = _('Shopping list items')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'name', 'measurement_unit',),
+                name='unique shopping list item')
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.measurement_unit}) - {self.amount}'
+
+
+class SimilarRecipe(models.Model):
+    """SimilarRecipe model."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+    )
+    score = models.FloatField(_('Score'))
+    computed_at = models.DateTimeField(_('Computed'), auto_now=True)
+
+    class Meta:
+        ordering = ('-score',)
+        verbose_name = _('Similar recipe')
+        verbose_name_plural = _('Similar recipes')
+        constraints = [
+            models.UniqueConstraint(fields=('recipe', 'similar',),
+                                    name='unique similar recipe')
+        ]
+
+
+class RecipeChange(models.Model):
+    """RecipeChange model, the change log behind recipe delta sync."""
+
+    id = models.BigAutoField(primary_key=True)
+    # Not a foreign key: tombstones outlive their recipes.
+    recipe_id = models.IntegerField(_('Recipe id'))
+    deleted = models.BooleanField(_('Deleted'), default=False)
+    created = models.DateTimeField(_('Created'), auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = _('Recipe change')
+        verbose_name_plural = _('Recipe changes')
+        indexes = [
+            models.Index(fields=('recipe_id', '-id'),
+                         name='recipe_change_recipe_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} {"deleted" if self.deleted else "saved"}'
+
+
+class MediaBlob(models.Model):
+    """MediaBlob model, reference count of a stored media file."""
+
+    name = models.CharField(_('Name'), max_length=255, unique=True)
+    refcount = models.IntegerField(_('References'), default=0)
+    updated = models.DateTimeField(_('Updated'), auto_now=True)
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = _('Media blob')
+        verbose_name_plural = _('Media blobs')
+        indexes = [
+            models.Index(fields=('refcount', 'updated'),
+                         name='media_blob_unused_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeDocument(models.Model):
+    """RecipeDocument model, the pre-rendered representation of a recipe."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+    )
+    revision = models.PositiveIntegerField(_('Revision'))
+    # Serialized JSON text; jsonb would not keep the field order.
+    data = models.TextField(_('Data'))
+
+    class Meta:
+        verbose_name = _('Recipe document')
+        verbose_name_plural = _('Recipe documents')
+
+    def __str__(self):
+        return f'{self.recipe_id} r{self.revision}'
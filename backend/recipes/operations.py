@@ -0,0 +1,45 @@
+"""
+Migration operations which only lock tables briefly on PostgreSQL.
+
+Migrations using them must set ``atomic = False``: ``CONCURRENTLY`` can't
+run inside a transaction. Other backends get plain statements, so the
+SQLite setup used in development and CI keeps migrating.
+"""
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class AddIndexConcurrentlyIfPostgres(AddIndexConcurrently):
+    """``CREATE INDEX CONCURRENTLY`` on PostgreSQL, a plain one elsewhere."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(
+            self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(
+            self, app_label, schema_editor, from_state, to_state)
+
+
+class RunSQLIfPostgres(migrations.RunSQL):
+    """Raw SQL for PostgreSQL-only features, skipped on other backends."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
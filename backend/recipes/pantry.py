@@ -0,0 +1,72 @@
+"""
+"What can I cook" matching over an ingredient -> recipe posting list.
+
+Postings are the recipe positions of every ingredient, stored as one
+array sorted by ingredient with offsets, next to the ingredient count of
+every recipe. Matching a pantry is a single ``bincount`` over the
+postings of the ingredients at hand.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .indexes import RecipeIndex
+from .models import RecipeIngredient
+
+Postings = namedtuple(
+    'Postings', 'recipe_ids ingredient_ids offsets postings counts'
+)
+
+
+class PantryIndex(RecipeIndex):
+
+    def build(self):
+        pairs = np.array(
+            RecipeIngredient.objects.order_by().values_list(
+                'ingredient_id', 'recipe_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+        recipe_ids, positions = np.unique(pairs[:, 1], return_inverse=True)
+        ingredient_ids, starts = np.unique(pairs[:, 0], return_index=True)
+        return Postings(
+            recipe_ids=recipe_ids,
+            ingredient_ids=ingredient_ids,
+            offsets=np.append(starts, len(pairs)),
+            postings=positions,
+            counts=np.bincount(positions, minlength=len(recipe_ids)),
+        )
+
+    @staticmethod
+    def _postings(index, ingredients):
+        found = np.searchsorted(index.ingredient_ids, ingredients)
+        parts = [
+            index.postings[index.offsets[i]:index.offsets[i + 1]]
+            for ingredient, i in zip(ingredients, found)
+            if i < len(index.ingredient_ids)
+            and index.ingredient_ids[i] == ingredient
+        ]
+        return np.concatenate(parts) if parts else np.array([], dtype=int)
+
+    def match(self, ingredients, exclude=(), max_missing=2):
+        """
+        Return recipe ids ranked by pantry coverage.
+
+        Recipes missing fewest ingredients come first, ties are broken by
+        how many of the given ingredients they use. Recipes containing an
+        excluded ingredient are dropped.
+        """
+        index = self.get()
+        matched = np.bincount(
+            self._postings(index, sorted(set(ingredients))),
+            minlength=len(index.recipe_ids),
+        )
+        missing = index.counts - matched
+        mask = (matched > 0) & (missing <= max_missing)
+        mask[self._postings(index, sorted(set(exclude)))] = False
+        candidates = np.flatnonzero(mask)
+        order = np.lexsort((-matched[candidates], missing[candidates]))
+        return index.recipe_ids[candidates[order]].tolist()
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,60 @@
+"""
+Popularity and trending scores of recipes.
+
+Popularity counts favourites and cart additions. Trending sums the same
+events with exponential time decay. Instead of decaying every stored
+score as time passes, each event adds ``exp(rate * (created - epoch))``:
+all scores then share the same ``exp(-rate * (now - epoch))`` factor, so
+their order equals the order of decayed scores and events can be added
+or removed exactly. Move ``TRENDING_EPOCH`` forward and recompute if the
+values ever approach float range.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Favorite, Recipe, ShoppingCart
+
+ORDERINGS = {
+    'popular': ('-popularity', '-pub_date'),
+    'trending': ('-trending', '-pub_date'),
+}
+
+
+def event_weight(created):
+    rate = math.log(2) / (settings.TRENDING_HALF_LIFE_DAYS * 24 * 3600)
+    age = (created - settings.TRENDING_EPOCH).total_seconds()
+    return math.exp(rate * age)
+
+
+def record_event(recipe_id, created, sign=1):
+    Recipe.objects.filter(pk=recipe_id).update(
+        popularity=F('popularity') + sign,
+        trending=F('trending') + sign * event_weight(created),
+    )
+
+
+def recompute(batch_size=1000):
+    """Recompute every score from favourites and carts in bulk."""
+    popularity = Counter()
+    trending = Counter()
+    for model in (Favorite, ShoppingCart):
+        events = model.objects.order_by().values_list('recipe_id', 'created')
+        for recipe_id, created in events.iterator(chunk_size=batch_size):
+            popularity[recipe_id] += 1
+            trending[recipe_id] += event_weight(created)
+    Recipe.objects.exclude(
+        pk__in=Favorite.objects.values('recipe_id')
+    ).exclude(
+        pk__in=ShoppingCart.objects.values('recipe_id')
+    ).exclude(popularity=0, trending=0).update(popularity=0, trending=0)
+    recipe_ids = sorted(popularity)
+    for start in range(0, len(recipe_ids), batch_size):
+        recipes = [
+            Recipe(pk=pk, popularity=popularity[pk], trending=trending[pk])
+            for pk in recipe_ids[start:start + batch_size]
+        ]
+        Recipe.objects.bulk_update(recipes, ('popularity', 'trending'))
+    return len(recipe_ids)
@@ -0,0 +1,142 @@
+"""
+Per-user ingredient tally of the shopping cart.
+
+``ShoppingListItem`` rows hold the summed amounts of every recipe in a
+user's cart, merged by ingredient name and base measurement unit. They
+are adjusted by delta whenever a recipe enters or leaves a cart or a
+carted recipe gets new ingredients, so reading the list never touches
+``RecipeIngredient``. Renaming or deleting an ingredient and editing a
+unit conversion change the keys themselves, the lists of the users
+concerned are rebuilt then.
+"""
+from collections import Counter
+
+from django.db import transaction
+
+from users.models import CustomUser
+
+from .models import (Ingredient, RecipeIngredient, ShoppingCart,
+                     ShoppingListItem, UnitConversion)
+
+
+def get_conversions():
+    return {
+        unit: (base_unit, factor)
+        for unit, base_unit, factor in UnitConversion.objects.values_list(
+            'unit', 'base_unit', 'factor')
+    }
+
+
+def totals_by_recipe(recipe_ids):
+    """Return ``{recipe id: {(name, base unit): amount}}``."""
+    totals = {}
+    conversions = get_conversions()
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+        'amount')
+    for recipe_id, name, measurement_unit, amount in rows:
+        base_unit, factor = conversions.get(
+            measurement_unit, (measurement_unit, 1))
+        totals.setdefault(recipe_id, Counter())[
+            name, base_unit] += amount * factor
+    return totals
+
+
+def recipe_totals(recipe_id):
+    """Return ``{(name, base unit): amount}`` for a single recipe."""
+    return totals_by_recipe([recipe_id]).get(recipe_id, Counter())
+
+
+def apply_delta(user_ids, delta):
+    """Add ``delta`` (which may hold negative amounts) to users' lists."""
+    delta = {key: amount for key, amount in delta.items() if amount}
+    if not user_ids or not delta:
+        return
+    with transaction.atomic():
+        # Locking the users applies concurrent deltas of a list in turn,
+        # items about to be created cannot be locked themselves.
+        list(CustomUser.objects.select_for_update().filter(
+            pk__in=user_ids).values_list('pk', flat=True))
+        items = {
+            (item.user_id, item.name, item.measurement_unit): item
+            for item in ShoppingListItem.objects.filter(
+                user_id__in=user_ids,
+                name__in={name for name, _ in delta})
+        }
+        changed, created = [], []
+        for user_id in user_ids:
+            for (name, measurement_unit), amount in delta.items():
+                item = items.get((user_id, name, measurement_unit))
+                if item is not None:
+                    item.amount += amount
+                    changed.append(item)
+                elif amount > 0:
+                    created.append(ShoppingListItem(
+                        user_id=user_id, name=name,
+                        measurement_unit=measurement_unit, amount=amount))
+        emptied = [item.pk for item in changed if item.amount <= 0]
+        ShoppingListItem.objects.bulk_update(
+            [item for item in changed if item.amount > 0], ['amount'])
+        ShoppingListItem.objects.bulk_create(created)
+        if emptied:
+            ShoppingListItem.objects.filter(pk__in=emptied).delete()
+
+
+def add_recipe(user_id, recipe_id):
+    apply_delta([user_id], recipe_totals(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    totals = recipe_totals(recipe_id)
+    apply_delta([user_id], {key: -amount for key, amount in totals.items()})
+
+
+def update_recipe(recipe_id, old_totals):
+    """Propagate an ingredient edit of a recipe to every cart holding it."""
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True))
+    if not user_ids:
+        return
+    delta = recipe_totals(recipe_id)
+    delta.subtract(old_totals)
+    apply_delta(user_ids, delta)
+
+
+def users_with(ingredients):
+    """Ids of users with a recipe using one of ``ingredients`` in the cart."""
+    return list(ShoppingCart.objects.filter(
+        recipe__ingredients__in=ingredients
+    ).values_list('user_id', flat=True).distinct())
+
+
+def users_with_units(units):
+    return users_with(Ingredient.objects.filter(measurement_unit__in=units))
+
+
+def rebuild(user_ids=None):
+    """Recompute lists from scratch, for all users when none are given."""
+    carts = ShoppingCart.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    recipes = {}
+    for user_id, recipe_id in carts.values_list('user_id', 'recipe_id'):
+        recipes.setdefault(user_id, []).append(recipe_id)
+    totals = totals_by_recipe(
+        {recipe_id for ids in recipes.values() for recipe_id in ids})
+    with transaction.atomic():
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        items.delete()
+        for user_id, recipe_ids in recipes.items():
+            user_totals = sum(
+                (totals.get(recipe_id, Counter()) for recipe_id in recipe_ids),
+                Counter())
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(
+                    user_id=user_id, name=name,
+                    measurement_unit=measurement_unit, amount=amount)
+                for (name, measurement_unit), amount in user_totals.items()
+            )
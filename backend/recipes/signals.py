@@ -0,0 +1,150 @@
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from users.models import CustomUser
+
+from . import indexes, media, scores, shopping_list, sync
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart, Tag,
+                     UnitConversion)
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_init, sender=Ingredient)
+def remember_ingredient_key(sender, instance, **kwargs):
+    if not {'name', 'measurement_unit'} & instance.get_deferred_fields():
+        instance._saved_key = (instance.name, instance.measurement_unit)
+
+
+@receiver(post_save, sender=Ingredient)
+def rekey_shopping_lists(sender, instance, created, **kwargs):
+    key = (instance.name, instance.measurement_unit)
+    # Loaded with the fields deferred the old key is unknown, rebuild.
+    if not created and key != getattr(instance, '_saved_key', None):
+        shopping_list.rebuild(shopping_list.users_with([instance]))
+    instance._saved_key = key
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remember_ingredient_users(sender, instance, **kwargs):
+    instance._shopping_list_users = shopping_list.users_with([instance])
+
+
+@receiver(post_delete, sender=Ingredient)
+def drop_from_shopping_lists(sender, instance, **kwargs):
+    # After the cascade, the rebuild no longer sees the ingredient.
+    user_ids = getattr(instance, '_shopping_list_users', None)
+    if user_ids:
+        shopping_list.rebuild(user_ids)
+
+
+@receiver(post_init, sender=UnitConversion)
+def remember_conversion_unit(sender, instance, **kwargs):
+    if 'unit' not in instance.get_deferred_fields():
+        instance._saved_unit = instance.unit
+
+
+@receiver(post_save, sender=UnitConversion)
+@receiver(post_delete, sender=UnitConversion)
+def reconvert_shopping_lists(sender, instance, **kwargs):
+    user_ids = shopping_list.users_with_units(
+        {instance.unit, getattr(instance, '_saved_unit', instance.unit)})
+    if user_ids:
+        shopping_list.rebuild(user_ids)
+    instance._saved_unit = instance.unit
+
+
+@receiver(post_save, sender=Tag)
+def touch_tagged_recipes(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_untagged_recipes(sender, instance, **kwargs):
+    # Before the cascade, which drops the rows linking the recipes.
+    Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredients=instance).touch()
+
+
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_losing_ingredient(sender, instance, **kwargs):
+    Recipe.objects.filter(ingredients=instance).touch()
+
+
+@receiver(post_save, sender=CustomUser)
+def touch_author_recipes(sender, instance, created, update_fields,
+                         **kwargs):
+    if created or update_fields and not AUTHOR_FIELDS & set(update_fields):
+        return
+    Recipe.objects.filter(author=instance).touch()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_indexes(sender, **kwargs):
+    transaction.on_commit(indexes.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def log_recipe_change(sender, instance, **kwargs):
+    sync.record([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_deletion(sender, instance, **kwargs):
+    sync.record([instance.pk], deleted=True)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_recipe_image(sender, instance, **kwargs):
+    if 'image' not in instance.get_deferred_fields():
+        instance._saved_image = instance.image.name
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe_image(sender, instance, created, **kwargs):
+    if not created and not hasattr(instance, '_saved_image'):
+        # Loaded with the image deferred, the old name is unknown.
+        return
+    saved = getattr(instance, '_saved_image', None)
+    if instance.image.name != saved:
+        media.add_reference(instance.image.name)
+        media.remove_reference(saved)
+        instance._saved_image = instance.image.name
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    media.remove_reference(getattr(instance, '_saved_image', None))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_score(sender, instance, created, **kwargs):
+    if created:
+        scores.record_event(instance.recipe_id, instance.created)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def remove_recipe_score(sender, instance, **kwargs):
+    scores.record_event(instance.recipe_id, instance.created, sign=-1)
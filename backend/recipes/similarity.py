@@ -0,0 +1,131 @@
+"""
+Precomputed "similar recipes" built from ingredient overlap.
+
+Recipes are rows of a sparse recipe x ingredient matrix weighted by
+TF-IDF, so rare ingredients count for more than salt and water. Rows are
+L2-normalized, which turns a sparse matrix product into cosine
+similarity. Neighbours are computed in batches of rows and stored in
+``SimilarRecipe``; requests only read that table.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Recipe, RecipeIngredient, SimilarRecipe
+
+
+def build_matrix():
+    """Return recipe ids and their normalized TF-IDF ingredient matrix."""
+    pairs = np.fromiter(
+        (value
+         for pair in RecipeIngredient.objects.values_list(
+             'recipe_id', 'ingredient_id').order_by().iterator()
+         for value in pair),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs)), (rows, columns)),
+        shape=(len(recipe_ids), len(ingredient_ids)),
+    )
+    document_frequency = np.bincount(columns, minlength=len(ingredient_ids))
+    idf = np.log((1 + len(recipe_ids)) / (1 + document_frequency)) + 1
+    matrix = sparse.csr_matrix(matrix.multiply(idf))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)))
+    norms[norms == 0] = 1
+    matrix = sparse.csr_matrix(matrix.multiply(1 / norms))
+    return recipe_ids, matrix
+
+
+def nearest(matrix, rows, count):
+    """Yield ``(row, [(column, score), ...])`` for the top ``count``."""
+    scores = (matrix[rows] @ matrix.T).tocsr()
+    for position, row in enumerate(rows):
+        start, end = scores.indptr[position], scores.indptr[position + 1]
+        columns = scores.indices[start:end]
+        values = scores.data[start:end]
+        keep = columns != row
+        columns, values = columns[keep], values[keep]
+        if len(values) > count:
+            top = np.argpartition(-values, count)[:count]
+            columns, values = columns[top], values[top]
+        order = np.argsort(-values, kind='stable')
+        yield row, list(zip(columns[order], values[order]))
+
+
+def _store(recipe_ids, matrix, rows, count, computed_at):
+    ids = recipe_ids[rows].tolist()
+    objs = [
+        SimilarRecipe(recipe_id=int(recipe_ids[row]),
+                      similar_id=int(recipe_ids[column]),
+                      score=float(score))
+        for row, neighbours in nearest(matrix, rows, count)
+        for column, score in neighbours
+    ]
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=ids).delete()
+        SimilarRecipe.objects.bulk_create(objs)
+        Recipe.objects.filter(id__in=ids).update(
+            similar_computed_at=computed_at)
+    return {obj.similar_id for obj in objs}
+
+
+def stale_recipes():
+    """Recipes changed since their neighbours were last computed."""
+    return Recipe.objects.filter(
+        Q(similar_computed_at__isnull=True)
+        | Q(updated_at__gt=F('similar_computed_at'))
+    ).values_list('id', flat=True)
+
+
+def _clear(recipes, computed_at):
+    """Mark ``recipes`` without ingredients as having no neighbours."""
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe__in=recipes).delete()
+        recipes.update(similar_computed_at=computed_at)
+
+
+def refresh(only=None, batch_size=500, count=None):
+    """
+    Recompute neighbour lists, for every recipe when ``only`` is None.
+
+    With ``only`` given, the recipes which listed them as neighbours and
+    their new neighbours are refreshed as well, since cosine similarity
+    is symmetric and their top lists may change too.
+    """
+    count = count or settings.SIMILAR_RECIPES_COUNT
+    # Taken before reading, edits made meanwhile leave the recipe stale.
+    computed_at = timezone.now()
+    recipe_ids, matrix = build_matrix()
+    if not len(recipe_ids):
+        _clear(Recipe.objects.all(), computed_at)
+        return 0
+    positions = {
+        int(recipe_id): row for row, recipe_id in enumerate(recipe_ids)
+    }
+    if only is None:
+        targets = list(range(len(recipe_ids)))
+        affected = set()
+        _clear(Recipe.objects.filter(ingredients=None), computed_at)
+    else:
+        only = set(only)
+        targets = [positions[pk] for pk in only if pk in positions]
+        affected = set(SimilarRecipe.objects.filter(
+            similar_id__in=only).values_list('recipe_id', flat=True))
+        _clear(Recipe.objects.filter(id__in=only - positions.keys()),
+               computed_at)
+    for start in range(0, len(targets), batch_size):
+        rows = np.array(targets[start:start + batch_size])
+        affected |= _store(recipe_ids, matrix, rows, count, computed_at)
+    if only is not None:
+        followers = sorted(
+            positions[pk] for pk in affected - only if pk in positions)
+        for start in range(0, len(followers), batch_size):
+            rows = np.array(followers[start:start + batch_size])
+            _store(recipe_ids, matrix, rows, count, computed_at)
+        return len(targets) + len(followers)
+    return len(targets)
@@ -0,0 +1,64 @@
+"""
+Content-addressed file storage for recipe images.
+
+Files are named by the SHA-256 of their content, so uploading a picture
+that is already stored writes nothing and hands back the existing name.
+Which names are still in use is tracked by ``MediaBlob`` reference
+counts, see ``recipes.media``.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+UPLOAD_PREFIX = '.upload-'
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        """Return ``dir/ab/abcdef....ext`` for ``content`` uploaded as name."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        hexdigest = digest.hexdigest()
+        return '/'.join(
+            part for part in (directory, hexdigest[:2],
+                              f'{hexdigest}{extension}') if part)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        # Mark the blob as wanted first: the collector skips blobs touched
+        # within its grace period, so the file checked below stays.
+        apps.get_model('recipes', 'MediaBlob').objects.filter(
+            name=name).update(updated=timezone.now())
+        full_path = self.path(name)
+        try:
+            # A reused file is new to the sweeper's grace period as well.
+            os.utime(full_path)
+            return name
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Write aside and rename, a blob is either complete or absent.
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=UPLOAD_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, full_path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return name
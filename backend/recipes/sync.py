@@ -0,0 +1,94 @@
+"""
+Recipe change log for delta sync.
+
+Every recipe write appends a ``RecipeChange`` row in the same transaction,
+deletions append tombstones. The row id is the sync position; clients
+get it back as an opaque token and read everything after it with one
+range scan on the primary key.
+
+Ids are handed out on insert but become visible on commit, so a slow
+transaction could commit a lower id behind a token already given out.
+Rows younger than ``RECIPE_CHANGES_DELAY`` seconds are therefore held
+back, together with every row after them, which covers every
+transaction shorter than that.
+"""
+import base64
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import RecipeChange
+
+Batch = namedtuple('Batch', 'position saved deleted has_more')
+
+
+def record(recipe_ids, deleted=False):
+    RecipeChange.objects.bulk_create(
+        RecipeChange(recipe_id=recipe_id, deleted=deleted)
+        for recipe_id in recipe_ids
+    )
+
+
+def encode_token(position):
+    return base64.urlsafe_b64encode(
+        f'v1:{position}'.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Return the position of ``token``, raising ValueError if invalid."""
+    try:
+        value = base64.urlsafe_b64decode(
+            token + '=' * (-len(token) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(token)
+    version, _, position = value.partition(':')
+    if version != 'v1' or not position.isdigit():
+        raise ValueError(token)
+    return int(position)
+
+
+def read(position, limit):
+    """
+    Return the changes after ``position``, at most ``limit`` log rows.
+
+    Several changes of one recipe collapse into its latest state; ids in
+    ``saved`` and ``deleted`` come in the order of their last change.
+    """
+    horizon = timezone.now() - timedelta(
+        seconds=settings.RECIPE_CHANGES_DELAY)
+    rows = []
+    # Filtering on ``created`` would let a row held back now fall behind
+    # a position given out past it, the scan stops at it instead.
+    for row in RecipeChange.objects.filter(id__gt=position).order_by(
+        'id'
+    ).values_list('id', 'recipe_id', 'deleted', 'created')[:limit + 1]:
+        if row[3] > horizon:
+            break
+        rows.append(row)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for _, recipe_id, deleted, _ in rows:
+        latest.pop(recipe_id, None)
+        latest[recipe_id] = deleted
+    return Batch(
+        position=rows[-1][0] if rows else position,
+        saved=[pk for pk, deleted in latest.items() if not deleted],
+        deleted=[pk for pk, deleted in latest.items() if deleted],
+        has_more=has_more,
+    )
+
+
+def compact():
+    """
+    Drop rows superseded by a later change of the same recipe.
+
+    The latest row of every recipe is kept, tombstones included, so a
+    client syncing from any position still sees the same final state.
+    """
+    return RecipeChange.objects.filter(Exists(RecipeChange.objects.filter(
+        recipe_id=OuterRef('recipe_id'), id__gt=OuterRef('id')
+    ))).delete()[0]
@@ -32,4 +32,5 @@ assert get_version() < '3.2.0', 'Пожалуйста, используйте в
 
 pytest_plugins = [
     'tests.fixtures.fixture_user',
+    'tests.fixtures.fixture_data',
 ]
\ No newline at end of file
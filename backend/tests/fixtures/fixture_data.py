@@ -0,0 +1,37 @@
+import pytest
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+
+@pytest.fixture
+def tags():
+    return [
+        Tag.objects.create(name='Breakfast', color='#0000FF',
+                           slug='breakfast'),
+        Tag.objects.create(name='Dinner', color='#FFFF00', slug='dinner'),
+    ]
+
+
+@pytest.fixture
+def ingredients():
+    return [
+        Ingredient.objects.create(name='flour', measurement_unit='g'),
+        Ingredient.objects.create(name='milk', measurement_unit='ml'),
+        Ingredient.objects.create(name='egg', measurement_unit='pcs'),
+    ]
+
+
+@pytest.fixture
+def make_recipe(user, tags, ingredients):
+    def make(amounts=(100, 200), author=None, **fields):
+        fields.setdefault('name', 'Pancakes')
+        fields.setdefault('text', 'Mix and fry.')
+        fields.setdefault('cooking_time', 20)
+        recipe = Recipe.objects.create(author=author or user, **fields)
+        recipe.tags.set(tags[:1])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in zip(ingredients, amounts))
+        return recipe
+    return make
@@ -0,0 +1,63 @@
+import pytest
+from django.core.cache import caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import cache
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.CACHES = cache.relocated(str(tmp_path / 'cache'))
+    settings.PROFILING_DIR = str(tmp_path / 'profiles')
+    settings.METRICS_DIR = str(tmp_path / 'metrics')
+    settings.REST_FRAMEWORK = dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={})
+    settings.CONCURRENCY_LIMITS = {}
+    caches[cache.FRONT].clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='TestUser', email='test@example.com',
+        first_name='Test', last_name='User', password='1234567')
+
+
+@pytest.fixture
+def another_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='TestUser2', email='test2@example.com',
+        first_name='Test', last_name='User', password='1234567')
+
+
+@pytest.fixture
+def admin(django_user_model):
+    return django_user_model.objects.create_superuser(
+        username='TestAdmin', email='admin@example.com',
+        first_name='Test', last_name='Admin', password='1234567')
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    token = Token.objects.create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def another_user_client(another_user):
+    client = APIClient()
+    token = Token.objects.create(user=another_user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def admin_client(admin):
+    client = APIClient()
+    token = Token.objects.create(user=admin)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
@@ -0,0 +1,86 @@
+import threading
+import time
+
+from django.core.cache import caches
+
+from api import cache
+
+
+def counting(value='value', started=None, release=None):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        if started is not None:
+            started.set()
+            release.wait(5)
+        return value
+    return compute, calls
+
+
+class TestNamespace:
+
+    def test_value_is_computed_once(self):
+        namespace = cache.Namespace('test-once', 60)
+        compute, calls = counting()
+        assert namespace.get_or_set('key', compute) == 'value'
+        assert namespace.get_or_set('key', compute) == 'value'
+        caches[cache.FRONT].clear()
+        assert namespace.get_or_set('key', compute) == 'value'
+        assert len(calls) == 1
+
+    def test_invalidate_and_delete_recompute(self):
+        namespace = cache.Namespace('test-invalidate', 60)
+        compute, calls = counting()
+        namespace.get_or_set('key', compute)
+        namespace.invalidate()
+        namespace.get_or_set('key', compute)
+        namespace.delete('key')
+        namespace.get_or_set('key', compute)
+        assert len(calls) == 3
+
+    def test_concurrent_misses_are_coalesced(self):
+        namespace = cache.Namespace('test-threads', 60)
+        started, release = threading.Event(), threading.Event()
+        compute, calls = counting('shared', started, release)
+        results = []
+
+        def read():
+            results.append(namespace.get_or_set('key', compute))
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        assert started.wait(5)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        assert results == ['shared'] * 4
+        assert len(calls) == 1
+
+    def test_waits_for_other_process(self):
+        # Separate instances share no flights, as in two workers.
+        leader = cache.Namespace('test-processes', 60)
+        follower = cache.Namespace('test-processes', 60)
+        started, release = threading.Event(), threading.Event()
+        compute, calls = counting('from leader', started, release)
+        thread = threading.Thread(
+            target=leader.get_or_set, args=('key', compute))
+        thread.start()
+        assert started.wait(5)
+        threading.Timer(0.1, release.set).start()
+        other, other_calls = counting('from follower')
+        assert follower.get_or_set('key', other) == 'from leader'
+        thread.join(5)
+        assert (len(calls), len(other_calls)) == (1, 0)
+
+    def test_stale_value_served_during_refresh(self, settings):
+        settings.CACHE_FRONT_TIMEOUT = 0
+        namespace = cache.Namespace('test-stale', 0.05, stale=60)
+        namespace.get_or_set('key', lambda: 'old')
+        time.sleep(0.1)
+        full_key = namespace.key('key')
+        caches[cache.SHARED].add(f'{full_key}:lock', 1, 60)
+        assert namespace.get_or_set('key', lambda: 'new') == 'old'
+        caches[cache.SHARED].delete(f'{full_key}:lock')
+        assert namespace.get_or_set('key', lambda: 'new') == 'new'
@@ -0,0 +1,363 @@
+import os
+import time
+from datetime import timedelta
+
+import pytest
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from recipes import media, scores, shopping_list, similarity, sync
+from recipes.facets import FacetIndex
+from recipes.models import (Favorite, MediaBlob, Recipe, RecipeChange,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            UnitConversion)
+from users import suggestions
+from users.models import AuthorSuggestion, Follow
+
+
+def list_of(user):
+    return {
+        (item.name, item.measurement_unit): item.amount
+        for item in ShoppingListItem.objects.filter(user=user)
+    }
+
+
+@pytest.mark.django_db
+class TestShoppingList:
+
+    def test_cart_changes_adjust_totals(self, user, make_recipe):
+        first = make_recipe((100, 200))
+        second = make_recipe((50, 0, 2))
+        ShoppingCart.objects.create(user=user, recipe=first)
+        ShoppingCart.objects.create(user=user, recipe=second)
+        assert list_of(user) == {
+            ('flour', 'g'): 150, ('milk', 'ml'): 200, ('egg', 'pcs'): 2,
+        }
+        ShoppingCart.objects.get(user=user, recipe=first).delete()
+        assert list_of(user) == {('flour', 'g'): 50, ('egg', 'pcs'): 2}
+
+    def test_units_are_merged(self, user, make_recipe, ingredients):
+        UnitConversion.objects.update_or_create(
+            unit='kg', defaults={'base_unit': 'g', 'factor': 1000})
+        ingredients[1].name = 'flour'
+        ingredients[1].measurement_unit = 'kg'
+        ingredients[1].save()
+        ShoppingCart.objects.create(user=user, recipe=make_recipe((100, 2)))
+        assert list_of(user) == {('flour', 'g'): 2100}
+
+    def test_recipe_edit_reaches_every_cart(
+            self, user, another_user, make_recipe, ingredients,
+            django_assert_max_num_queries):
+        recipe = make_recipe((100, 200))
+        for owner in (user, another_user):
+            ShoppingCart.objects.create(user=owner, recipe=recipe)
+        old_totals = shopping_list.recipe_totals(recipe.id)
+        RecipeIngredient.objects.filter(
+            recipe=recipe, ingredient=ingredients[0]).update(amount=300)
+        RecipeIngredient.objects.filter(
+            recipe=recipe, ingredient=ingredients[1]).delete()
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredients[2], amount=3)
+        with django_assert_max_num_queries(10):
+            shopping_list.update_recipe(recipe.id, old_totals)
+        expected = {('flour', 'g'): 300, ('egg', 'pcs'): 3}
+        assert list_of(user) == expected
+        assert list_of(another_user) == expected
+
+    def test_ingredient_rename_rekeys_lists(
+            self, user, make_recipe, ingredients):
+        ShoppingCart.objects.create(user=user, recipe=make_recipe((100, 200)))
+        ingredients[0].name = 'wheat flour'
+        ingredients[0].save()
+        assert list_of(user) == {('wheat flour', 'g'): 100,
+                                 ('milk', 'ml'): 200}
+
+    def test_ingredient_delete_drops_it(self, user, make_recipe, ingredients):
+        ShoppingCart.objects.create(user=user, recipe=make_recipe((100, 200)))
+        ingredients[1].delete()
+        assert list_of(user) == {('flour', 'g'): 100}
+
+    def test_conversion_edit_reconverts(
+            self, user, make_recipe, ingredients):
+        ingredients[1].measurement_unit = 'cup'
+        ingredients[1].save()
+        ShoppingCart.objects.create(user=user, recipe=make_recipe((100, 2)))
+        conversion = UnitConversion.objects.create(
+            unit='cup', base_unit='ml', factor=250)
+        assert list_of(user) == {('flour', 'g'): 100, ('milk', 'ml'): 500}
+        conversion.factor = 240
+        conversion.save()
+        assert list_of(user) == {('flour', 'g'): 100, ('milk', 'ml'): 480}
+        conversion.delete()
+        assert list_of(user) == {('flour', 'g'): 100, ('milk', 'cup'): 2}
+
+    def test_rebuild_matches_incremental_totals(self, user, make_recipe):
+        ShoppingCart.objects.create(user=user, recipe=make_recipe((1, 2)))
+        ShoppingCart.objects.create(user=user, recipe=make_recipe((3, 4, 5)))
+        incremental = list_of(user)
+        shopping_list.rebuild([user.id])
+        assert list_of(user) == incremental
+
+
+@pytest.mark.django_db
+class TestRecipeRevision:
+
+    def test_save_bumps_revision_in_database(self, make_recipe):
+        recipe = make_recipe()
+        assert recipe.revision == 1
+        stale_copy = Recipe.objects.get(pk=recipe.pk)
+        recipe.name = 'Crepes'
+        recipe.save()
+        stale_copy.text = 'Whisk first.'
+        stale_copy.save()
+        assert recipe.revision == 2
+        assert stale_copy.revision == 3
+        assert Recipe.objects.get(pk=recipe.pk).revision == 3
+
+    def test_touch_bumps_revision(self, make_recipe):
+        recipe = make_recipe()
+        Recipe.objects.filter(pk=recipe.pk).touch()
+        assert Recipe.objects.get(pk=recipe.pk).revision == 2
+
+
+@pytest.mark.django_db
+class TestSimilarRecipes:
+
+    def test_recipes_without_neighbours_are_not_stale(self, make_recipe):
+        pancakes = make_recipe((100, 200))
+        crepes = make_recipe((50, 300))
+        bare = make_recipe(())
+        assert set(similarity.stale_recipes()) == {
+            pancakes.pk, crepes.pk, bare.pk}
+        similarity.refresh(list(similarity.stale_recipes()))
+        assert not similarity.stale_recipes()
+        assert list(pancakes.similar.values_list(
+            'similar_id', flat=True)) == [crepes.pk]
+        assert not bare.similar.exists()
+
+    def test_edit_makes_recipe_stale(self, make_recipe):
+        recipe = make_recipe()
+        similarity.refresh()
+        recipe.name = 'Crepes'
+        recipe.save()
+        assert list(similarity.stale_recipes()) == [recipe.pk]
+
+
+@pytest.mark.django_db
+class TestRecipeChanges:
+
+    def test_token_round_trip(self):
+        assert sync.decode_token(sync.encode_token(42)) == 42
+        for token in ('', 'bm9wZQ', sync.encode_token(1)[:-1] + '!'):
+            with pytest.raises(ValueError):
+                sync.decode_token(token)
+
+    def test_changes_collapse_to_latest_state(self, settings, make_recipe):
+        settings.RECIPE_CHANGES_DELAY = 0
+        kept = make_recipe()
+        dropped = make_recipe()
+        kept.name = 'Crepes'
+        kept.save()
+        dropped_id = dropped.pk
+        dropped.delete()
+        batch = sync.read(0, 100)
+        assert batch.saved == [kept.pk]
+        assert batch.deleted == [dropped_id]
+        assert not batch.has_more
+        assert sync.read(batch.position, 100) == sync.Batch(
+            batch.position, [], [], False)
+
+    def test_recent_changes_are_held_back(self, settings, make_recipe):
+        settings.RECIPE_CHANGES_DELAY = 60
+        make_recipe()
+        assert sync.read(0, 100) == sync.Batch(0, [], [], False)
+        RecipeChange.objects.update(
+            created=timezone.now() - timedelta(seconds=61))
+        assert sync.read(0, 100).saved
+
+    def test_newer_row_holds_back_later_ids(self, settings, make_recipe):
+        settings.RECIPE_CHANGES_DELAY = 60
+        slow, fast = make_recipe(), make_recipe()
+        RecipeChange.objects.filter(recipe_id=fast.pk).update(
+            created=timezone.now() - timedelta(seconds=61))
+        assert sync.read(0, 100) == sync.Batch(0, [], [], False)
+        RecipeChange.objects.filter(recipe_id=slow.pk).update(
+            created=timezone.now() - timedelta(seconds=61))
+        assert sync.read(0, 100).saved == [slow.pk, fast.pk]
+
+    def test_limit_pages_through_log(self, settings, make_recipe):
+        settings.RECIPE_CHANGES_DELAY = 0
+        recipes = [make_recipe() for _ in range(3)]
+        first = sync.read(0, 2)
+        assert first.has_more
+        second = sync.read(first.position, 2)
+        assert not second.has_more
+        assert first.saved + second.saved == [
+            recipe.pk for recipe in recipes]
+
+
+@pytest.mark.django_db
+class TestFacetIndex:
+
+    def test_patched_index_matches_rebuild(self, settings, another_user,
+                                           tags, make_recipe):
+        settings.RECIPE_CHANGES_DELAY = 0
+        index = FacetIndex()
+        kept, edited = make_recipe(), make_recipe(cooking_time=5)
+        data = index.build()
+        created = make_recipe(author=another_user, cooking_time=90)
+        edited.cooking_time = 45
+        edited.save()
+        edited.tags.set(tags[1:])
+        kept.delete()
+        data = index.update(data)
+        assert data == index.build()
+        assert data.tags == {tags[0].pk: {created.pk},
+                             tags[1].pk: {edited.pk}}
+        assert index.update(data) is data
+
+    def refcounts(self):
+        return dict(MediaBlob.objects.values_list('name', 'refcount'))
+
+    def test_same_content_is_stored_once(self, make_recipe):
+        first, second = make_recipe(), make_recipe()
+        first.image.save('first.png', ContentFile(b'pancake'))
+        second.image.save('second.PNG', ContentFile(b'pancake'))
+        assert first.image.name == second.image.name
+        assert first.image.name.endswith('.png')
+        assert self.refcounts() == {first.image.name: 2}
+        directory = os.path.dirname(first.image.path)
+        assert os.listdir(directory) == [os.path.basename(first.image.path)]
+
+    def test_replaced_and_deleted_images_are_released(self, make_recipe):
+        recipe = make_recipe()
+        recipe.image.save('old.png', ContentFile(b'old'))
+        old = recipe.image.name
+        recipe.image.save('new.png', ContentFile(b'new'))
+        new = recipe.image.name
+        assert self.refcounts() == {old: 0, new: 1}
+        Recipe.objects.get(pk=recipe.pk).delete()
+        assert self.refcounts() == {old: 0, new: 0}
+
+    def test_collect_removes_only_unused_files(self, make_recipe):
+        kept, dropped = make_recipe(), make_recipe()
+        kept.image.save('kept.png', ContentFile(b'kept'))
+        dropped.image.save('dropped.png', ContentFile(b'dropped'))
+        path = dropped.image.path
+        dropped.delete()
+        assert media.collect(grace=3600) == 0
+        assert media.collect(grace=0) == 1
+        assert not os.path.exists(path)
+        assert os.path.exists(kept.image.path)
+        assert self.refcounts() == {kept.image.name: 1}
+
+
+@pytest.mark.django_db
+class TestMediaSweep:
+
+    def age(self, path, seconds):
+        past = time.time() - seconds
+        os.utime(path, (past, past))
+
+    def test_reused_file_is_touched(self, make_recipe):
+        first, second = make_recipe(), make_recipe()
+        first.image.save('first.png', ContentFile(b'pancake'))
+        self.age(first.image.path, 3600)
+        second.image.save('second.png', ContentFile(b'pancake'))
+        assert time.time() - os.path.getmtime(first.image.path) < 60
+
+    def test_orphans_are_quarantined_then_purged(self, settings, tmp_path):
+        quarantine = str(tmp_path / 'quarantine')
+        storage = Recipe._meta.get_field('image').storage
+        path = storage.path('recipes/ab/orphan.png')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'orphan')
+        self.age(path, 7200)
+        stats = media.sweep(grace=3600, quarantine=quarantine)
+        assert stats['orphans'] == 1
+        moved = os.path.join(quarantine, 'recipes/ab/orphan.png')
+        assert not os.path.exists(path)
+        assert os.path.exists(moved)
+        assert media.purge_quarantine(quarantine, 3600)['purged'] == 0
+        self.age(moved, 7200)
+        assert media.purge_quarantine(quarantine, 3600)['purged'] == 1
+        assert os.listdir(quarantine) == []
+
+
+@pytest.mark.django_db
+class TestRecipeScores:
+
+    def scores(self, recipe):
+        recipe.refresh_from_db(fields=['popularity', 'trending'])
+        return recipe.popularity, recipe.trending
+
+    def test_events_adjust_scores(self, user, another_user, make_recipe):
+        recipe = make_recipe()
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=another_user, recipe=recipe)
+        popularity, trending = self.scores(recipe)
+        assert popularity == 2
+        assert trending > 0
+        Favorite.objects.get(user=user, recipe=recipe).delete()
+        popularity, trending = self.scores(recipe)
+        assert popularity == 1
+        assert trending == pytest.approx(scores.event_weight(
+            ShoppingCart.objects.get(recipe=recipe).created))
+
+    def test_newer_events_weigh_more(self):
+        now = timezone.now()
+        assert (scores.event_weight(now)
+                > scores.event_weight(now - timedelta(days=30)))
+
+    def test_recipe_save_keeps_concurrent_scores(self, user, make_recipe):
+        recipe = make_recipe()
+        loaded = Recipe.objects.get(pk=recipe.pk)
+        Favorite.objects.create(user=user, recipe=recipe)
+        loaded.name = 'Crepes'
+        loaded.save()
+        assert self.scores(recipe)[0] == 1
+        assert Recipe.objects.get(pk=recipe.pk).name == 'Crepes'
+
+    def test_recompute_matches_events(self, user, another_user, make_recipe):
+        first, second, unused = make_recipe(), make_recipe(), make_recipe()
+        Favorite.objects.create(user=user, recipe=first)
+        Favorite.objects.create(user=another_user, recipe=first)
+        ShoppingCart.objects.create(user=user, recipe=second)
+        expected = {r.pk: self.scores(r) for r in (first, second, unused)}
+        Recipe.objects.update(popularity=7, trending=7)
+        assert scores.recompute(batch_size=1) == 2
+        for recipe in (first, second, unused):
+            popularity, trending = self.scores(recipe)
+            assert popularity == expected[recipe.pk][0]
+            assert trending == pytest.approx(expected[recipe.pk][1])
+
+
+@pytest.mark.django_db
+class TestAuthorSuggestions:
+
+    def suggested(self, user):
+        return list(AuthorSuggestion.objects.filter(
+            user=user).values_list('author__username', flat=True))
+
+    def test_ranked_by_co_subscriptions(self, django_user_model, user):
+        users = {
+            name: django_user_model.objects.create_user(
+                username=name, email=f'{name}@example.com', password='1')
+            for name in ('followed', 'close', 'far', 'fan', 'other')
+        }
+        follows = [
+            (user, 'followed'), ('fan', 'followed'), ('other', 'followed'),
+            ('fan', 'close'), ('other', 'close'), ('fan', 'far'),
+            ('fan', user),
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=users.get(follower, follower),
+                   author=users.get(author, author))
+            for follower, author in follows
+        )
+        assert suggestions.refresh() == 3
+        assert self.suggested(user) == ['close', 'far']
+        AuthorSuggestion.objects.all().delete()
+        suggestions.refresh_user(user.pk)
+        assert self.suggested(user) == ['close', 'far']
@@ -0,0 +1,75 @@
+from api import plans
+
+SEQ_SCAN = {
+    'Node Type': 'Limit', 'Plan Rows': 6, 'Actual Rows': 6,
+    'Actual Loops': 1,
+    'Plans': [{
+        'Node Type': 'Seq Scan', 'Relation Name': 'recipes_favorite',
+        'Filter': '(user_id = 42)', 'Plan Rows': 40,
+        'Actual Rows': 6, 'Actual Loops': 1,
+        'Rows Removed by Filter': 25000,
+    }],
+}
+
+SORT_SPILL = {
+    'Node Type': 'Limit', 'Plan Rows': 3, 'Actual Rows': 3,
+    'Actual Loops': 1,
+    'Plans': [{
+        'Node Type': 'Sort', 'Sort Key': ['recipes_recipe.pub_date DESC'],
+        'Sort Method': 'external merge', 'Sort Space Used': 2048,
+        'Sort Space Type': 'Disk', 'Plan Rows': 600, 'Actual Rows': 3,
+        'Actual Loops': 1,
+        'Plans': [{
+            'Node Type': 'Seq Scan', 'Relation Name': 'recipes_recipe',
+            'Filter': '(author_id = 7)', 'Plan Rows': 600,
+            'Actual Rows': 600, 'Actual Loops': 1,
+            'Rows Removed by Filter': 300,
+        }],
+    }],
+}
+
+MISESTIMATE = {
+    'Node Type': 'Index Scan', 'Relation Name': 'recipes_shoppingcart',
+    'Index Name': 'recipes_shoppingcart_user_id_idx', 'Plan Rows': 5,
+    'Actual Rows': 4000, 'Actual Loops': 1,
+}
+
+
+def test_seq_scan_on_large_table():
+    assert plans.findings(SEQ_SCAN) == [(
+        'Seq Scan on recipes_favorite read 25006 rows',
+        'CREATE INDEX CONCURRENTLY recipes_favorite_user_id_idx '
+        'ON recipes_favorite (user_id);',
+    )]
+    assert plans.findings(SEQ_SCAN, min_rows=100000) == []
+
+
+def test_sort_spill():
+    problem, suggestion = plans.findings(SORT_SPILL)[0]
+    assert problem == ('Sort on recipes_recipe.pub_date DESC over 600 rows '
+                       'spilled 2048 kB to disk')
+    assert suggestion == (
+        'CREATE INDEX CONCURRENTLY recipes_recipe_author_id_pub_date_desc_idx'
+        ' ON recipes_recipe (author_id, pub_date DESC);'
+    )
+
+
+def test_row_misestimate():
+    assert plans.findings(MISESTIMATE) == [(
+        'Index Scan on recipes_shoppingcart estimated 5 rows, got 4000, '
+        'ANALYZE may be due',
+        None,
+    )]
+    accurate = dict(MISESTIMATE, **{'Plan Rows': 3500})
+    assert plans.findings(accurate) == []
+
+
+def test_suggest_and_shape():
+    assert plans._suggest(
+        'ingredients', ['UPPER(name::text) text_pattern_ops']
+    ) == ('CREATE INDEX CONCURRENTLY ingredients_upper_name_idx '
+          'ON ingredients (UPPER(name::text) text_pattern_ops);')
+    shape = plans.shape(SORT_SPILL)
+    assert shape == ['Limit', [['Sort', [['Seq Scan', 'recipes_recipe']]]]]
+    assert plans.compare({'author_recipes': shape},
+                         {'author_recipes': ['Limit']}) == ['author_recipes']
@@ -0,0 +1,446 @@
+import csv
+import gzip
+import json
+import os
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api import metrics
+from api.throttling import ConcurrencySlot
+from recipes import pantry, scores
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeDocument,
+                            RecipeIngredient, ShoppingCart)
+from users import memberships
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAuthorStats:
+
+    def test_favorite_toggle_refreshes_author_stats(
+            self, another_user, user_client, make_recipe):
+        recipe = make_recipe(author=another_user)
+        url = f'/api/users/{another_user.pk}/stats/'
+        assert user_client.get(url).data['favorites_received'] == 0
+
+        response = user_client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        assert response.status_code == 201
+        assert user_client.get(url).data['favorites_received'] == 1
+
+        response = user_client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        assert response.status_code == 204
+        assert user_client.get(url).data['favorites_received'] == 0
+
+    def test_follow_refreshes_both_users(
+            self, user, another_user, user_client):
+        url = f'/api/users/{user.pk}/stats/'
+        assert user_client.get(url).data['following_count'] == 0
+        response = user_client.post(
+            f'/api/users/{another_user.pk}/subscribe/')
+        assert response.status_code == 201
+        assert user_client.get(url).data['following_count'] == 1
+        assert user_client.get(
+            f'/api/users/{another_user.pk}/stats/'
+        ).data['followers_count'] == 1
+
+
+@pytest.mark.django_db
+class TestProfiles:
+
+    def test_staff_request_returns_profile_id(self, admin_client):
+        response = admin_client.get('/api/tags/', HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+        response = admin_client.get(f'/api/profiles/{profile_id}/')
+        assert response.status_code == 200
+        assert response.data['path'] == '/api/tags/'
+
+    def test_sampled_request_hides_profile_id(
+            self, settings, admin_client, user_client):
+        settings.PROFILING_SAMPLE_RATE = 1
+        response = user_client.get('/api/tags/')
+        assert 'X-Profile-Id' not in response
+        assert len(admin_client.get('/api/profiles/').data) == 1
+
+    def test_unknown_sort_key(self, admin_client):
+        profile_id = admin_client.get(
+            '/api/tags/', HTTP_X_PROFILE='1')['X-Profile-Id']
+        url = f'/api/profiles/{profile_id}/'
+        assert admin_client.get(url, {'sort': 'tottime'}).status_code == 400
+        assert admin_client.get(url, {'sort': 'time'}).status_code == 200
+
+
+@pytest.mark.django_db
+class TestRecipeChanges:
+
+    def test_client_syncs_from_token(self, settings, user_client, make_recipe):
+        settings.RECIPE_CHANGES_DELAY = 0
+        recipe = make_recipe()
+        response = user_client.get('/api/recipes/changes/')
+        assert [item['id'] for item in response.data['results']] == [
+            recipe.pk]
+        token = response.data['next']
+        response = user_client.get('/api/recipes/changes/', {'since': token})
+        assert response.data['results'] == []
+        assert response.data['next'] == token
+
+    def test_invalid_token(self, user_client):
+        response = user_client.get('/api/recipes/changes/', {'since': 'x'})
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestRecipeEtags:
+
+    def test_fieldsets_change_etag(self, user_client, make_recipe):
+        recipe = make_recipe()
+        for url in ('/api/recipes/', f'/api/recipes/{recipe.pk}/'):
+            full = user_client.get(url)['ETag']
+            sparse = user_client.get(url, {'fields': 'id,tags'})['ETag']
+            same = user_client.get(url, {'fields': 'tags,id,id'})['ETag']
+            assert full != sparse
+            assert sparse == same
+            assert user_client.get(url, {'omit': 'text'})['ETag'] != full
+
+    def test_matching_etag_returns_not_modified(
+            self, user_client, make_recipe):
+        make_recipe()
+        etag = user_client.get('/api/recipes/', {'fields': 'id'})['ETag']
+        response = user_client.get(
+            '/api/recipes/', {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        response = user_client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+
+
+@pytest.mark.django_db
+class TestUserStatsExpansion:
+
+    def test_user_endpoints_expand_stats(self, user, user_client):
+        response = user_client.get(f'/api/users/{user.pk}/',
+                                   {'expand': 'stats'})
+        assert response.data['stats']['recipes_count'] == 0
+        response = user_client.get('/api/users/', {'expand': 'stats'})
+        assert all('stats' in item for item in response.data['results'])
+
+    def test_nested_authors_are_not_expanded(
+            self, user_client, make_recipe):
+        for _ in range(5):
+            make_recipe()
+        params = {'fields': 'id,author'}
+        user_client.get('/api/recipes/', params)
+        with CaptureQueriesContext(connection) as plain:
+            user_client.get('/api/recipes/', params)
+        with CaptureQueriesContext(connection) as expanded:
+            response = user_client.get(
+                '/api/recipes/', dict(params, expand='stats'))
+        assert 'stats' not in response.data['results'][0]['author']
+        assert len(expanded) == len(plain)
+
+
+@pytest.mark.django_db
+class TestMetrics:
+
+    def test_process_metrics_stay_in_memory(self, settings, admin_client):
+        admin_client.get('/api/tags/')
+        response = admin_client.get('/metrics')
+        assert response.status_code == 200
+        assert 'view="api:tags-list"' in response.content.decode()
+        assert not os.path.exists(settings.METRICS_DIR)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestMemberships:
+
+    def flags(self, client, recipe):
+        response = client.get(f'/api/recipes/{recipe.pk}/')
+        return (response.data['is_favorited'],
+                response.data['is_in_shopping_cart'], response['ETag'])
+
+    def test_writes_patch_cached_sets(self, user, user_client, make_recipe):
+        recipe = make_recipe()
+        favorited, in_cart, etag = self.flags(user_client, recipe)
+        assert not favorited and not in_cart
+        user_client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        entry = cache.get(memberships.ENTRY_KEY.format(user.pk))
+        assert list(entry['favorites']) == [recipe.pk]
+        assert entry['version'] == memberships.version(user)
+        favorited, in_cart, new_etag = self.flags(user_client, recipe)
+        assert favorited and not in_cart
+        assert new_etag != etag
+
+    def test_process_local_cache_reads_database(
+            self, settings, user_client, make_recipe):
+        settings.CACHES = dict(settings.CACHES, default={
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'})
+        recipe = make_recipe()
+        _, in_cart, etag = self.flags(user_client, recipe)
+        assert not in_cart
+        # No signals, as if another worker with its own cache served it.
+        ShoppingCart.objects.bulk_create(
+            [ShoppingCart(user=recipe.author, recipe=recipe)])
+        _, in_cart, new_etag = self.flags(user_client, recipe)
+        assert in_cart
+        assert new_etag != etag
+
+
+@pytest.mark.django_db
+class TestRecipeDocuments:
+
+    def page(self, client):
+        return client.get('/api/recipes/').data['results']
+
+    def test_documents_follow_tag_and_ingredient_changes(
+            self, user_client, tags, ingredients, make_recipe):
+        recipe = make_recipe()
+        recipe.tags.set(tags)
+        Recipe.objects.filter(pk=recipe.pk).touch()
+        assert len(self.page(user_client)[0]['tags']) == 2
+        assert RecipeDocument.objects.filter(recipe=recipe).exists()
+
+        tags[1].name = 'Supper'
+        tags[1].save()
+        names = {tag['name'] for tag in self.page(user_client)[0]['tags']}
+        assert names == {'Breakfast', 'Supper'}
+
+        tags[1].delete()
+        assert len(self.page(user_client)[0]['tags']) == 1
+        ingredients[0].delete()
+        assert [item['name'] for item in self.page(
+            user_client)[0]['ingredients']] == ['milk']
+
+    def test_delete_changes_etag(self, user_client, tags, make_recipe):
+        recipe = make_recipe()
+        url = f'/api/recipes/{recipe.pk}/'
+        etag = user_client.get(url)['ETag']
+        tags[0].delete()
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.data['tags'] == []
+
+
+def db_queries(view):
+    key = json.dumps([metrics.DB_QUERIES.name, '', [view], None])
+    return metrics.collect().get(key, 0)
+
+
+@pytest.mark.django_db
+class TestAsgiMetrics:
+
+    def test_sync_views_count_queries(self, settings, user):
+        settings.ROOT_URLCONF = 'foodgram.asgi_urls'
+        before = db_queries('users:users-detail')
+        response = async_to_sync(AsyncClient().get)(f'/api/users/{user.pk}/')
+        assert response.status_code == 200
+        assert db_queries('users:users-detail') > before
+
+
+@pytest.mark.django_db
+class TestThrottling:
+
+    def test_rate_applies_to_scoped_actions(
+            self, settings, user_client, make_recipe):
+        recipe = make_recipe()
+        settings.REST_FRAMEWORK = dict(
+            settings.REST_FRAMEWORK,
+            DEFAULT_THROTTLE_RATES={'recipes': '2/min'})
+        for _ in range(2):
+            assert user_client.get('/api/recipes/').status_code == 200
+        response = user_client.get('/api/recipes/')
+        assert response.status_code == 429
+        assert 'Retry-After' in response
+        # Only list, pantry, facets and changes use the recipes scope.
+        assert user_client.get(
+            f'/api/recipes/{recipe.pk}/').status_code == 200
+        assert user_client.get('/api/ingredients/').status_code == 200
+
+    def test_busy_scope_returns_503(self, settings, tmp_path, user_client):
+        settings.CONCURRENCY_LOCK_DIR = str(tmp_path / 'slots')
+        settings.CONCURRENCY_LIMITS = {'listing': 1}
+        held = ConcurrencySlot('listing', 1)
+        assert held.acquire()
+        try:
+            response = user_client.get('/api/recipes/')
+        finally:
+            held.release()
+        assert response.status_code == 503
+        assert response['Retry-After'] == str(
+            settings.CONCURRENCY_RETRY_AFTER)
+        assert user_client.get('/api/recipes/').status_code == 200
+        self.assert_free(settings)
+
+    def test_slot_released_on_errors(
+            self, settings, tmp_path, monkeypatch, user_client):
+        settings.CONCURRENCY_LOCK_DIR = str(tmp_path / 'slots')
+        settings.CONCURRENCY_LIMITS = {'listing': 1}
+        response = user_client.get('/api/recipes/pantry/',
+                                   {'ingredients': 'x'})
+        assert response.status_code == 400
+        self.assert_free(settings)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError('index unavailable')
+        monkeypatch.setattr(pantry.pantry_index, 'match', fail)
+        with pytest.raises(RuntimeError):
+            user_client.get('/api/recipes/pantry/', {'ingredients': '1'})
+        self.assert_free(settings)
+
+    def assert_free(self, settings):
+        slot = ConcurrencySlot('listing', 1)
+        assert slot.acquire()
+        slot.release()
+
+
+@pytest.mark.django_db
+class TestPantry:
+
+    @pytest.fixture
+    def recipes(self, make_recipe, ingredients):
+        flour, milk, egg = ingredients
+        both = make_recipe((100, 200), name='Both')
+        three = make_recipe((100, 200, 2), name='Three')
+        flour_only = make_recipe((100,), name='Flour')
+        egg_only = make_recipe((), name='Egg')
+        RecipeIngredient.objects.create(
+            recipe=egg_only, ingredient=egg, amount=1)
+        return both, three, flour_only, egg_only
+
+    def match(self, client, ingredients, **params):
+        params['ingredients'] = ','.join(str(i.pk) for i in ingredients)
+        response = client.get('/api/recipes/pantry/', params)
+        assert response.status_code == 200
+        return [item['name'] for item in response.data['results']]
+
+    def test_fully_covered_recipes_rank_first(
+            self, user_client, recipes, ingredients):
+        flour, milk, _ = ingredients
+        assert self.match(user_client, [flour, milk]) == [
+            'Both', 'Flour', 'Three']
+
+    def test_missing_limit(self, user_client, recipes, ingredients):
+        flour, milk, egg = ingredients
+        assert self.match(user_client, [flour], max_missing=0) == ['Flour']
+        assert self.match(user_client, [flour], max_missing=1) == [
+            'Flour', 'Both']
+        assert self.match(user_client, [egg], max_missing=2) == [
+            'Egg', 'Three']
+
+    def test_excluded_and_unknown_ingredients(
+            self, user_client, recipes, ingredients):
+        flour, milk, egg = ingredients
+        unknown = Ingredient(pk=99999)
+        assert self.match(user_client, [flour, milk], exclude=egg.pk) == [
+            'Both', 'Flour']
+        assert self.match(user_client, [flour, milk, unknown],
+                          exclude=unknown.pk) == ['Both', 'Flour', 'Three']
+        assert self.match(user_client, [unknown]) == []
+
+    def test_invalid_ids(self, user_client):
+        response = user_client.get('/api/recipes/pantry/',
+                                   {'ingredients': '1,x'})
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestRecipeOrdering:
+
+    def names(self, client, ordering):
+        response = client.get('/api/recipes/', {'ordering': ordering})
+        assert response.status_code == 200
+        return [item['name'] for item in response.data['results']]
+
+    def test_popular_and_trending(self, user, another_user, user_client,
+                                  make_recipe):
+        old = make_recipe(name='Old favourite')
+        new = make_recipe(name='New favourite')
+        make_recipe(name='Unknown')
+        Favorite.objects.create(user=user, recipe=old)
+        Favorite.objects.create(user=another_user, recipe=old)
+        Favorite.objects.filter(recipe=old).update(
+            created=timezone.now() - timedelta(days=365))
+        scores.recompute()
+        Favorite.objects.create(user=user, recipe=new)
+        assert self.names(user_client, 'popular') == [
+            'Old favourite', 'New favourite', 'Unknown']
+        assert self.names(user_client, 'trending') == [
+            'New favourite', 'Old favourite', 'Unknown']
+        assert user_client.get(
+            '/api/recipes/', {'ordering': 'newest'}).status_code == 400
+
+
+@pytest.mark.django_db
+class TestExport:
+
+    def body(self, response):
+        assert response.status_code == 200
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_and_csv(self, admin_client, tags):
+        response = admin_client.get('/api/export/recipe_tags/')
+        assert self.body(response) == b''
+        response = admin_client.get('/api/export/users/')
+        assert response['Content-Type'] == 'application/x-ndjson'
+        lines = self.body(response).decode().splitlines()
+        assert [json.loads(line)['username'] for line in lines] == [
+            'TestAdmin']
+        response = admin_client.get('/api/export/users/', {'output': 'csv'})
+        assert response['Content-Type'] == 'text/csv'
+        rows = list(csv.reader(self.body(response).decode().splitlines()))
+        assert rows[0] == ['id', 'email', 'username', 'first_name',
+                           'last_name', 'date_joined']
+        assert [row[2] for row in rows[1:]] == ['TestAdmin']
+
+    def test_since_filters(self, admin, admin_client, user, another_user):
+        type(user).objects.filter(pk=user.pk).update(
+            date_joined=timezone.now() - timedelta(days=2))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        response = admin_client.get('/api/export/users/', {'since': since})
+        ids = [json.loads(line)['id']
+               for line in self.body(response).splitlines()]
+        assert ids == [admin.pk, another_user.pk]
+        response = admin_client.get('/api/export/users/',
+                                    {'since_id': another_user.pk})
+        assert self.body(response) == b''
+        response = admin_client.get('/api/export/follows/', {'since': since})
+        assert response.status_code == 400
+
+    def test_gzip(self, admin_client):
+        response = admin_client.get('/api/export/users/', {'gzip': 'true'})
+        assert response['Content-Encoding'] == 'gzip'
+        assert response['Content-Type'] == 'application/x-ndjson'
+        line = gzip.decompress(self.body(response)).decode()
+        assert json.loads(line)['username'] == 'TestAdmin'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_streams_under_asgi(self, settings, admin, admin_client):
+        settings.ROOT_URLCONF = 'foodgram.asgi_urls'
+        type(admin).objects.bulk_create(
+            type(admin)(username=f'user{number}',
+                        email=f'user{number}@example.com')
+            for number in range(50)
+        )
+        token = f'Token {admin.auth_token.key}'
+
+        async def download():
+            # The ASGI handler reads the body on the event loop too.
+            response = await AsyncClient().get(
+                '/api/export/users/', authorization=token)
+            return response, b''.join(response.streaming_content)
+
+        response, body = async_to_sync(download)()
+        assert response.status_code == 200
+        lines = body.decode().splitlines()
+        assert len(lines) == 51
+        assert json.loads(lines[-1])['username'] == 'user49'
+
+    def test_rejected_requests(self, admin_client, user_client):
+        assert admin_client.get('/api/export/tokens/').status_code == 404
+        assert admin_client.get(
+            '/api/export/users/', {'output': 'xml'}).status_code == 400
+        assert user_client.get('/api/export/users/').status_code == 403
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from api.pagination import EstimatedCountPaginator
+
 from .models import CustomUser, Follow
 
 
@@ -10,7 +12,7 @@ class CustomUserAdmin(UserAdmin):
         'email', 'username', 'first_name', 'last_name', 'password',
         'is_subscribed'
     )
-    list_filter = ('email', 'username',)
+    list_filter = ('is_staff', 'is_active')
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Permissions', {'fields': ('is_staff', 'is_active')}),
@@ -22,9 +24,20 @@ class CustomUserAdmin(UserAdmin):
                 'email', 'username', 'first_name', 'last_name', 'password1',
                 'password2', 'is_staff', 'is_active', 'is_subscribed')}),
     )
-    search_fields = ('email',)
+    search_fields = ('email', 'username')
     ordering = ('email',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__email', 'author__email')
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(CustomUser, CustomUserAdmin)
-admin.site.register(Follow)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,143 @@
+"""
+Per-user favourite, cart and follow sets kept in the cache.
+
+Serializing a page asks for every row whether the viewer favourited it,
+has it in the cart or follows its author. The three id sets of a user
+are small, so they are cached together as one entry and the flags become
+set lookups. Every entry carries the version it was built at; writes
+bump the user's version and patch the entry in place when it is current,
+otherwise it is dropped and rebuilt on the next read. The version also
+stands for the viewer in recipe ETags.
+
+With a process-local ``default`` cache a worker would keep serving sets
+another worker has changed, so they are read from the database for each
+request instead and the version is a digest of their content.
+"""
+import hashlib
+import time
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.cache import is_shared
+from recipes.models import Favorite, ShoppingCart
+
+from .models import Follow
+
+ENTRY_KEY = 'memberships:{}'
+VERSION_KEY = 'memberships-version:{}'
+
+SOURCES = {
+    'favorites': (Favorite, 'recipe_id'),
+    'cart': (ShoppingCart, 'recipe_id'),
+    'follows': (Follow, 'author_id'),
+}
+
+
+class Memberships:
+    """Id sets of one user, ``favorites``, ``cart`` and ``follows``."""
+
+    def __init__(self, entry=None):
+        entry = entry or {}
+        self.version = entry.get('version')
+        for kind in SOURCES:
+            setattr(self, kind, frozenset(entry.get(kind, ())))
+
+
+def _init_version(user_id):
+    # A fresh stamp never matches an entry built before it was evicted.
+    cache.add(VERSION_KEY.format(user_id), time.time_ns(), None)
+    return cache.get(VERSION_KEY.format(user_id))
+
+
+def _read(user_id):
+    return {
+        kind: array('q', sorted(model.objects.filter(
+            user_id=user_id).values_list(field, flat=True)))
+        for kind, (model, field) in SOURCES.items()
+    }
+
+
+def _build(user_id, version):
+    entry = dict(_read(user_id), version=version)
+    cache.set(ENTRY_KEY.format(user_id), entry,
+              settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return entry
+
+
+def _uncached(user):
+    """Return the entry of ``user`` read once for the user object."""
+    entry = getattr(user, '_memberships_entry', None)
+    if entry is None:
+        entry = _read(user.pk)
+        digest = hashlib.sha1()
+        for kind in SOURCES:
+            digest.update(entry[kind].tobytes() + b';')
+        entry['version'] = digest.hexdigest()[:16]
+        user._memberships_entry = entry
+    return entry
+
+
+def version(user):
+    """Return the version stamp of the user's sets."""
+    if user.is_anonymous:
+        return None
+    if not is_shared():
+        return _uncached(user)['version']
+    return cache.get(VERSION_KEY.format(user.pk)) or _init_version(user.pk)
+
+
+def get(user):
+    """Return the ``Memberships`` of ``user``, built once per version."""
+    if user.is_anonymous:
+        return Memberships()
+    if not is_shared():
+        return Memberships(_uncached(user))
+    entry_key = ENTRY_KEY.format(user.pk)
+    version_key = VERSION_KEY.format(user.pk)
+    found = cache.get_many([entry_key, version_key])
+    current = found.get(version_key) or _init_version(user.pk)
+    entry = found.get(entry_key)
+    if entry is None or entry['version'] != current:
+        entry = _build(user.pk, current)
+    return Memberships(entry)
+
+
+def for_request(request):
+    """``get`` the requesting user's sets once per request."""
+    if request is None:
+        return Memberships()
+    memberships = getattr(request, '_memberships', None)
+    if memberships is None:
+        memberships = get(request.user)
+        request._memberships = memberships
+    return memberships
+
+
+def update(user_id, kind, pk, present):
+    """Write a committed add (``present``) or removal through."""
+    if not is_shared():
+        return
+    entry_key = ENTRY_KEY.format(user_id)
+    try:
+        current = cache.incr(VERSION_KEY.format(user_id))
+    except ValueError:
+        _init_version(user_id)
+        cache.delete(entry_key)
+        return
+    entry = cache.get(entry_key)
+    if entry is None:
+        return
+    if entry['version'] != current - 1:
+        # Another write got in between, let the next read rebuild.
+        cache.delete(entry_key)
+        return
+    ids = set(entry[kind])
+    if present:
+        ids.add(pk)
+    else:
+        ids.discard(pk)
+    entry[kind] = array('q', sorted(ids))
+    entry['version'] = current
+    cache.set(entry_key, entry, settings.MEMBERSHIP_CACHE_TIMEOUT)
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.14 on 2026-10-19 15:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20220801_1257'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorSuggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Computed')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Author suggestion',
+                'verbose_name_plural': 'Author suggestions',
+                'ordering': ('-score',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='authorsuggestion',
+            index=models.Index(fields=['user', '-score'], name='author_suggestion_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='authorsuggestion',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique author suggestion'),
+        ),
+    ]
@@ -47,3 +47,33 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=('user', 'author',),
                                     name='unique follow')
         ]
+
+
+class AuthorSuggestion(models.Model):
+    """AuthorSuggestion model, an author a user may want to follow."""
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='author_suggestions'
+    )
+    author = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='suggested_to'
+    )
+    score = models.FloatField(_('Score'))
+    computed_at = models.DateTimeField(_('Computed'), auto_now=True)
+
+    class Meta:
+        ordering = ('-score',)
+        verbose_name = _('Author suggestion')
+        verbose_name_plural = _('Author suggestions')
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'author',),
+                                    name='unique author suggestion')
+        ]
+        indexes = [
+            models.Index(fields=('user', '-score'),
+                         name='author_suggestion_user_idx'),
+        ]
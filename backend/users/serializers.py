@@ -1,9 +1,11 @@
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from api.fieldsets import SparseFieldsetMixin
 from users.models import CustomUser
 
-from .models import Follow
+from . import memberships, stats
+from .models import AuthorSuggestion
 
 
 class ChangePasswordSerializer(serializers.Serializer):
@@ -16,25 +18,56 @@ class ChangePasswordSerializer(serializers.Serializer):
     current_password = serializers.CharField(required=True)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for users endpoint.
     """
 
     is_subscribed = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed'
+            'is_subscribed', 'stats'
         )
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        expand = request.query_params.get('expand', '') if request else ''
+        # Authors nested in other representations would cost a stats
+        # lookup each, only the user endpoints expand them.
+        if 'stats' not in expand.split(',') or self._field_path():
+            fields.pop('stats', None)
+        return fields
+
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=obj.id).exists()
+        request = self.context.get('request')
+        return obj.id in memberships.for_request(request).follows
+
+    def get_stats(self, obj):
+        if hasattr(obj, 'stats_recipes_count'):
+            return stats.from_annotations(obj)
+        return stats.get_stats(obj.id)
+
+
+class AuthorSuggestionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for suggested authors endpoint.
+    """
+
+    id = serializers.ReadOnlyField(source='author.id')
+    email = serializers.ReadOnlyField(source='author.email')
+    username = serializers.ReadOnlyField(source='author.username')
+    first_name = serializers.ReadOnlyField(source='author.first_name')
+    last_name = serializers.ReadOnlyField(source='author.last_name')
+
+    class Meta:
+        model = AuthorSuggestion
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'score')
 
 
 class CreateCustomUserSerializer(serializers.ModelSerializer):
@@ -0,0 +1,67 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+from . import memberships, stats, suggestions
+from .models import Follow
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_author_stats(sender, instance, **kwargs):
+    transaction.on_commit(partial(stats.invalidate, instance.author_id))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_recipe_author_stats(sender, instance, **kwargs):
+    if sender.recipe.is_cached(instance):
+        author_id = instance.recipe.author_id
+    else:
+        author_id = Recipe.objects.filter(
+            pk=instance.recipe_id).values_list('author_id', flat=True).first()
+    if author_id is not None:
+        transaction.on_commit(partial(stats.invalidate, author_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_stats(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(stats.invalidate, instance.user_id, instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def refresh_author_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(suggestions.refresh_user, instance.user_id))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def add_membership(sender, instance, created, **kwargs):
+    if created:
+        _update_membership(sender, instance, present=True)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def remove_membership(sender, instance, **kwargs):
+    _update_membership(sender, instance, present=False)
+
+
+def _update_membership(sender, instance, present):
+    for kind, (model, field) in memberships.SOURCES.items():
+        if model is sender:
+            transaction.on_commit(partial(
+                memberships.update, instance.user_id, kind,
+                getattr(instance, field), present))
@@ -0,0 +1,68 @@
+"""
+Author statistics computed by one aggregate query and cached per author.
+"""
+from django.conf import settings
+from django.db.models import Avg, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.cache import Namespace
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+from .models import CustomUser, Follow
+
+STATS = Namespace('author-stats', settings.AUTHOR_STATS_TIMEOUT,
+                  stale=settings.AUTHOR_STATS_STALE)
+
+
+def _aggregate(queryset, field, function):
+    return Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(value=function).values('value')
+    )
+
+
+def _count(queryset, field):
+    return Coalesce(
+        _aggregate(queryset, field, Count('pk')), 0,
+        output_field=IntegerField()
+    )
+
+
+def annotate_stats(queryset):
+    """Annotate users with ``stats_*`` values, subqueries of one query."""
+    return queryset.annotate(
+        stats_recipes_count=_count(Recipe.objects, 'author'),
+        stats_followers_count=_count(Follow.objects, 'author'),
+        stats_following_count=_count(Follow.objects, 'user'),
+        stats_favorites_received=_count(Favorite.objects, 'recipe__author'),
+        stats_in_shopping_carts=_count(
+            ShoppingCart.objects, 'recipe__author'),
+        stats_average_cooking_time=_aggregate(
+            Recipe.objects, 'author', Avg('cooking_time')),
+    )
+
+
+def from_annotations(user):
+    stats = {
+        name[len('stats_'):]: value
+        for name, value in vars(user).items() if name.startswith('stats_')
+    }
+    if stats['average_cooking_time'] is not None:
+        stats['average_cooking_time'] = round(
+            stats['average_cooking_time'], 1)
+    return stats
+
+
+def _compute(author_id):
+    user = annotate_stats(CustomUser.objects.filter(pk=author_id)).only(
+        'pk').first()
+    return None if user is None else from_annotations(user)
+
+
+def get_stats(author_id):
+    """Return cached stats of an author, or None if there is no such user."""
+    return STATS.get_or_set(author_id, lambda: _compute(author_id))
+
+
+def invalidate(*author_ids):
+    STATS.delete(*author_ids)
@@ -0,0 +1,127 @@
+"""
+Authors to follow, ranked by co-follow strength.
+
+Follows form a sparse user x author matrix F. Two authors are as close as
+the cosine of their follower sets, C = D^-1/2 F'F D^-1/2 with D the
+follower counts, and a user's candidates score F[u] C, weighted up for
+authors who published recently. C itself is never built: rows are scored
+as ((F[u] D^-1/2) F') F D^-1/2 in batches of users. Results are stored
+in ``AuthorSuggestion``; requests only read that table.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from scipy import sparse
+
+from recipes.models import Recipe
+
+from .models import AuthorSuggestion, Follow
+
+
+def build_matrix(pairs):
+    """Return user ids, author ids and the follow matrix of the pairs."""
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    user_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    author_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs)), (rows, columns)),
+        shape=(len(user_ids), len(author_ids)),
+    )
+    return user_ids, author_ids, matrix
+
+
+def activity_weights(author_ids):
+    """1 + log(1 + recipes published within SUGGESTIONS_ACTIVITY_DAYS)."""
+    since = timezone.now() - timedelta(
+        days=settings.SUGGESTIONS_ACTIVITY_DAYS)
+    recent = dict(Recipe.objects.filter(
+        pub_date__gte=since
+    ).order_by().values('author').annotate(
+        count=Count('id')).values_list('author', 'count'))
+    return 1 + np.log1p([recent.get(int(pk), 0) for pk in author_ids])
+
+
+def rank(matrix, rows, user_ids, author_ids, degree, activity, count):
+    """Yield ``(row, [(column, score), ...])`` for the top ``count``."""
+    inverse_root = 1 / np.sqrt(np.maximum(degree, 1))
+    left = sparse.csr_matrix(matrix[rows].multiply(inverse_root))
+    scores = sparse.csr_matrix(
+        ((left @ matrix.T) @ matrix).multiply(inverse_root * activity))
+    for position, row in enumerate(rows):
+        start, end = scores.indptr[position], scores.indptr[position + 1]
+        columns = scores.indices[start:end]
+        values = scores.data[start:end]
+        followed = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+        keep = ~np.isin(columns, followed)
+        keep &= author_ids[columns] != user_ids[row]
+        columns, values = columns[keep], values[keep]
+        if len(values) > count:
+            top = np.argpartition(-values, count)[:count]
+            columns, values = columns[top], values[top]
+        order = np.argsort(-values, kind='stable')
+        yield row, list(zip(columns[order], values[order]))
+
+
+def _store(user_ids, author_ids, ranked, rows):
+    objs = [
+        AuthorSuggestion(user_id=int(user_ids[row]),
+                         author_id=int(author_ids[column]),
+                         score=float(score))
+        for row, candidates in ranked
+        for column, score in candidates
+    ]
+    with transaction.atomic():
+        AuthorSuggestion.objects.filter(
+            user_id__in=user_ids[rows].tolist()).delete()
+        AuthorSuggestion.objects.bulk_create(objs)
+
+
+def refresh(batch_size=500, count=None):
+    """Recompute suggestions of every user who follows someone."""
+    count = count or settings.SUGGESTED_AUTHORS_COUNT
+    pairs = list(Follow.objects.order_by().values_list(
+        'user_id', 'author_id').iterator())
+    AuthorSuggestion.objects.filter(user__follower__isnull=True).delete()
+    if not pairs:
+        return 0
+    user_ids, author_ids, matrix = build_matrix(pairs)
+    degree = np.asarray(matrix.sum(axis=0)).ravel()
+    activity = activity_weights(author_ids)
+    for start in range(0, len(user_ids), batch_size):
+        rows = np.arange(start, min(start + batch_size, len(user_ids)))
+        _store(user_ids, author_ids, rank(
+            matrix, rows, user_ids, author_ids, degree, activity, count
+        ), rows)
+    return len(user_ids)
+
+
+def refresh_user(user_id, count=None):
+    """
+    Recompute the suggestions of one user after they (un)subscribed.
+
+    Only the follows of users sharing an author with them are read; they
+    are all a co-follow score of this user depends on.
+    """
+    count = count or settings.SUGGESTED_AUTHORS_COUNT
+    followed = Follow.objects.filter(user_id=user_id).values('author')
+    co_followers = Follow.objects.filter(author__in=followed).values('user')
+    pairs = list(Follow.objects.filter(
+        user__in=co_followers).order_by().values_list('user_id', 'author_id'))
+    if not pairs:
+        AuthorSuggestion.objects.filter(user_id=user_id).delete()
+        return
+    user_ids, author_ids, matrix = build_matrix(pairs)
+    followers = dict(Follow.objects.filter(
+        author_id__in=author_ids.tolist()
+    ).order_by().values('author').annotate(
+        count=Count('id')).values_list('author', 'count'))
+    degree = np.array([followers.get(int(pk), 0) for pk in author_ids])
+    rows = np.searchsorted(user_ids, [user_id])
+    _store(user_ids, author_ids, rank(
+        matrix, rows, user_ids, author_ids, degree,
+        activity_weights(author_ids), count
+    ), rows)
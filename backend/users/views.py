@@ -6,13 +6,17 @@ from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from api import fieldsets
 from api.pagination import LimitPageNumberPagination
 from api.serializers import FollowSerializer
 from api.permissions import IsOwnerOrReadOnly
+from api.throttling import ConcurrencyLimitMixin
+
 from .mixins import CreateListRetrieveViewSet
-from .models import CustomUser, Follow
-from .serializers import (ChangePasswordSerializer, CreateCustomUserSerializer,
-                          UserSerializer)
+from .models import AuthorSuggestion, CustomUser, Follow
+from .serializers import (AuthorSuggestionSerializer, ChangePasswordSerializer,
+                          CreateCustomUserSerializer, UserSerializer)
+from .stats import annotate_stats, get_stats
 
 
 class ChangePasswordView(CreateAPIView):
@@ -46,13 +50,29 @@ class ChangePasswordView(CreateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UsersViewSet(CreateListRetrieveViewSet):
+class UsersViewSet(ConcurrencyLimitMixin, CreateListRetrieveViewSet):
     """Users view."""
 
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
     permission_classes = (AllowAny,)
     pagination_class = LimitPageNumberPagination
+    lookup_value_regex = r'\d+'
+    throttle_scopes = {
+        'list': 'users',
+        'subscriptions': 'subscriptions',
+    }
+    concurrency_limits = {
+        'subscriptions': 'listing',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expand = self.request.query_params.get('expand', '').split(',')
+        if (self.action in ['list', 'retrieve'] and 'stats' in expand
+                and fieldsets.requested(self.request, 'stats')):
+            return annotate_stats(queryset)
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
@@ -68,19 +88,34 @@ class UsersViewSet(CreateListRetrieveViewSet):
         serializer = self.get_serializer(user_instance)
         return Response(serializer.data, status.HTTP_200_OK)
 
+    @action(detail=True)
+    def stats(self, request, pk=None):
+        author_stats = get_stats(pk)
+        if author_stats is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(author_stats)
+
     @action(detail=False, permission_classes=(IsOwnerOrReadOnly,))
     def subscriptions(self, request):
         user = request.user
         queryset = Follow.objects.filter(
             user=user
         )
+        page = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
-            queryset,
+            page,
             many=True,
             context={'request': request}
         )
-        page = self.paginate_queryset(serializer.data)
-        return self.get_paginated_response(page)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def suggestions(self, request):
+        queryset = AuthorSuggestion.objects.filter(
+            user=request.user).select_related('author')
+        page = self.paginate_queryset(queryset)
+        serializer = AuthorSuggestionSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=True,
@@ -97,11 +132,11 @@ class UsersViewSet(CreateListRetrieveViewSet):
         author = get_object_or_404(CustomUser, id=pk)
         if model.objects.filter(user=request.user, author=author).exists():
             return Response({
-                _('message'): _('Your already has subcribed on this author')
+                'message': _('Your already has subcribed on this author')
             }, status=status.HTTP_400_BAD_REQUEST)
         if request.user == author:
             return Response({
-                _('message'): _('You can\'t subscribe on yourself')
+                'message': _('You can\'t subscribe on yourself')
             }, status=status.HTTP_400_BAD_REQUEST)
         follow = model.objects.create(user=request.user, author=author)
         serializer = FollowSerializer(
@@ -113,13 +148,13 @@ class UsersViewSet(CreateListRetrieveViewSet):
         author = get_object_or_404(CustomUser, id=pk)
         if request.user == author:
             return Response({
-                _('errors'): _('You can\'t unsubcribed on yourself')
+                'errors': _('You can\'t unsubcribed on yourself')
             }, status=status.HTTP_400_BAD_REQUEST)
         obj = model.objects.filter(user=request.user, author=author)
         if obj.exists():
             obj.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({
-            _('message'):
+            'message':
             _('Subcription on this author has already been deleted')
         }, status=status.HTTP_400_BAD_REQUEST)